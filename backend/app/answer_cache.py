@@ -0,0 +1,94 @@
+"""
+Semantic answer cache for RAG queries.
+Returns a previous answer when a new question's embedding is close enough
+to a cached one, skipping retrieval and LLM generation.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from app.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    In-process LRU + TTL cache of RAG results keyed by query embedding.
+    Lookups are a cosine-similarity scan over the (small, bounded) set of
+    cached query vectors.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry["ts"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, query_vector: List[float], k: int, rerank: bool = False) -> Optional[Dict]:
+        """Return the cached result for the nearest matching query, or None."""
+        if self.max_entries <= 0:
+            return None
+
+        qvec = self._normalize(query_vector)
+        with self._lock:
+            self._evict_expired()
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry["params"] == (k, rerank)]
+            if not candidates:
+                return None
+
+            matrix = np.stack([entry["vector"] for _, entry in candidates])
+            scores = matrix @ qvec
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            logger.info(f"Answer cache hit (similarity={scores[best]:.3f})")
+            return entry["result"]
+
+    def add(self, query_vector: List[float], k: int, result: Dict, rerank: bool = False) -> None:
+        """Insert a RAG result, evicting the least recently used entry if full."""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": self._normalize(query_vector),
+                "params": (k, rerank),
+                "result": result,
+                "ts": time.monotonic()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached answers (e.g. after the index changes)."""
+        with self._lock:
+            self._entries.clear()
+
+
+answer_cache = AnswerCache()
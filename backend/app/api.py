@@ -2,18 +2,30 @@
 FastAPI application with endpoints for document upload, querying, and management.
 """
 import os
-import shutil
+import re
+import asyncio
+import hashlib
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+import aiofiles
+import orjson
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Tuple
 import logging
-from app.rag import build_and_store_index, rag_query
-from app.store import delete_collection, get_qdrant_client
-from app.config import UPLOAD_DIR, MAX_FILE_SIZE, QDRANT_COLLECTION
+from qdrant_client import AsyncQdrantClient
+from app.rag import build_and_store_index, rag_query, rag_query_batch
+from app.store import (
+    create_async_qdrant_client, delete_collection_async, get_qdrant_client, has_source_points_async
+)
+from app.embeddings import get_embeddings
+from app.answer_cache import answer_cache
+from app.file_hashes import get_indexed_file, record_indexed_file, forget_indexed_file, clear_file_hashes
+from app.config import UPLOAD_DIR, MAX_FILE_SIZE, QDRANT_COLLECTION, DEFAULT_K, ASK_BATCH_MAX_QUESTIONS
 
 # Configure logging
 logging.basicConfig(
@@ -22,16 +34,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="Multimodal RAG Chatbot API",
-    description="RAG system supporting PDF, DOCX, PPTX, TXT, Markdown, and Images",
-    version="1.0.0"
-)
-
-# Startup event to log when app starts
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Log startup info and hold a shared async Qdrant client for the app lifetime."""
     port = os.getenv("PORT", "8000")
     logger.info(f"🚀 ChatPDF API starting on port {port}")
     logger.info(f"Environment: PORT={port}")
@@ -43,6 +48,81 @@ async def startup_event():
         logger.info(f"FastAPI version: {fastapi.__version__}")
     except Exception as e:
         logger.error(f"Error checking FastAPI: {e}")
+    
+    app.state.qdrant = create_async_qdrant_client()
+    # Warm clients in the background so startup (and the healthcheck) is not delayed
+    warmup_task = asyncio.create_task(warmup(app.state.qdrant))
+    try:
+        yield
+    finally:
+        warmup_task.cancel()
+        await app.state.qdrant.close()
+
+
+async def warmup(qdrant: AsyncQdrantClient) -> None:
+    """
+    Pay cold-start costs (client construction, connection setup) before the
+    first user request: embeddings client, sync and async Qdrant clients.
+    """
+    def warm_sync_clients():
+        embeddings = get_embeddings()
+        # Bypass the embedding cache so the request actually opens the connection
+        embeddings.inner.embed_query("warmup")
+        get_qdrant_client().get_collections()
+    
+    try:
+        await asyncio.gather(asyncio.to_thread(warm_sync_clients), qdrant.get_collections())
+        logger.info("Warmup complete: embeddings and Qdrant clients ready")
+    except Exception as e:
+        logger.warning(f"Warmup failed (clients will be initialized on first request): {e}")
+
+
+def get_async_qdrant(request: Request) -> AsyncQdrantClient:
+    """Dependency returning the app-wide async Qdrant client."""
+    return request.app.state.qdrant
+
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="Multimodal RAG Chatbot API",
+    description="RAG system supporting PDF, DOCX, PPTX, TXT, Markdown, and Images",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Precomputed error messages
+FILE_TOO_LARGE_MSG = f"File too large. Maximum size: {MAX_FILE_SIZE / (1024*1024):.1f}MB"
+API_KEY_ERROR_MSG = "Google API key is missing or invalid. Please check your .env file."
+
+# Multipart framing (boundaries, part headers) on top of the file itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+class RejectOversizeUploads:
+    """
+    Reject uploads whose Content-Length already exceeds the limit,
+    before the multipart body is read and spooled to disk.
+    Plain ASGI middleware: every other request (e.g. streaming /ask) is passed
+    straight through without the BaseHTTPMiddleware wrapping.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/upload" and scope["method"] == "POST":
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + UPLOAD_OVERHEAD_BYTES:
+                response = ORJSONResponse(status_code=413, content={"detail": FILE_TOO_LARGE_MSG})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+# Registered before CORS so CORS headers are still added to the 413 response
+app.add_middleware(RejectOversizeUploads)
+
 
 # CORS middleware
 # Allow origins from environment variable or default to all
@@ -68,11 +148,91 @@ if not UPLOAD_PATH.is_absolute():
     UPLOAD_PATH = backend_dir / UPLOAD_DIR
 UPLOAD_PATH.mkdir(exist_ok=True, parents=True)
 
+# Read uploads in 1 MiB chunks
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 # Supported file extensions
-SUPPORTED_EXTENSIONS = {
+SUPPORTED_EXTENSIONS = frozenset({
     ".pdf", ".docx", ".pptx", ".txt", ".md", ".markdown",
     ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"
-}
+})
+SUPPORTED_EXTENSIONS_MSG = ", ".join(sorted(SUPPORTED_EXTENSIONS))
+
+# Attempts at a unique upload filename before giving up
+MAX_FILENAME_ATTEMPTS = 3
+
+# Error triage tables: (compiled pattern, user-facing message), first match wins
+UPLOAD_ERROR_MESSAGES = (
+    (re.compile(r"google_api_key|api key", re.IGNORECASE), API_KEY_ERROR_MSG),
+    (re.compile(r"qdrant|connection", re.IGNORECASE), "Cannot connect to Qdrant vector database. Please ensure Qdrant is running."),
+)
+QUERY_ERROR_MESSAGES = (
+    (re.compile(r"google_api_key|api key|authentication", re.IGNORECASE), API_KEY_ERROR_MSG),
+    (re.compile(r"quota|rate limit", re.IGNORECASE), "Google API quota exceeded or rate limited. Please try again later or check your API quota."),
+    (re.compile(r"collection|qdrant|connection", re.IGNORECASE), "Vector database error. Please ensure Qdrant is running and you have uploaded at least one document."),
+    (re.compile(r"no documents|empty", re.IGNORECASE), "No documents found. Please upload at least one document first."),
+    (re.compile(r"failed to retrieve|retrieve documents", re.IGNORECASE), "Failed to retrieve documents from vector database. Please ensure documents are properly indexed."),
+)
+_DIMENSION_RE = re.compile(r"dimension", re.IGNORECASE)
+
+
+def triage_error(error_msg: str, rules) -> Optional[str]:
+    """Map a raw error message to a user-facing message, or None if no rule matches."""
+    return next((message for pattern, message in rules if pattern.search(error_msg)), None)
+
+
+def create_upload_file(original_name: str) -> Tuple[Path, int]:
+    """
+    Atomically create a new file in the upload directory.
+    Tries the original name first, then random suffixes on collision.
+    Returns the path and an open file descriptor for writing.
+    """
+    stem, dot, ext = original_name.rpartition(".")
+    candidate = UPLOAD_PATH / original_name
+    for _ in range(MAX_FILENAME_ATTEMPTS + 1):
+        try:
+            fd = os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            return candidate, fd
+        except FileExistsError:
+            suffix = uuid.uuid4().hex[:8]
+            candidate = UPLOAD_PATH / (f"{stem}_{suffix}.{ext}" if dot else f"{original_name}_{suffix}")
+    raise HTTPException(status_code=500, detail="Could not allocate a unique filename for upload")
+
+
+def cached_rag_query(question: str, k: Optional[int] = None, rerank: bool = False) -> dict:
+    """
+    Non-streaming rag_query fronted by the semantic answer cache.
+    Falls back to a plain rag_query if the question cannot be embedded.
+    """
+    k = k or DEFAULT_K
+    try:
+        query_vector = get_embeddings().embed_query(question)
+    except Exception as e:
+        logger.warning(f"Answer cache skipped, could not embed question: {e}")
+        return rag_query(question, k=k, stream=False, rerank=rerank)
+    
+    cached = answer_cache.lookup(query_vector, k, rerank=rerank)
+    if cached is not None:
+        return cached
+    
+    result = rag_query(question, k=k, stream=False, rerank=rerank)
+    answer_cache.add(query_vector, k, result, rerank=rerank)
+    return result
+
+
+def serialize_sources(docs) -> List[dict]:
+    """Convert retrieved documents to the source info returned by the API."""
+    return [
+        {
+            "index": i + 1,
+            "source_file": doc.metadata.get("source_file", "Unknown"),
+            "page": doc.metadata.get("page"),
+            "slide_number": doc.metadata.get("slide_number"),
+            "content_type": doc.metadata.get("content_type"),
+            "preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+        }
+        for i, doc in enumerate(docs)
+    ]
 
 
 @app.get("/")
@@ -85,7 +245,10 @@ async def health_check():
 
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...),
+    qdrant: AsyncQdrantClient = Depends(get_async_qdrant)
+):
     """
     Upload and index a document file.
     Supports: PDF, DOCX, PPTX, TXT, Markdown, Images (PNG, JPG, etc.)
@@ -95,50 +258,63 @@ async def upload_file(file: UploadFile = File(...)):
     if file_ext not in SUPPORTED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file type: {file_ext}. Supported: {', '.join(SUPPORTED_EXTENSIONS)}"
+            detail=f"Unsupported file type: {file_ext}. Supported: {SUPPORTED_EXTENSIONS_MSG}"
         )
     
     # Save file (handle duplicate names)
-    file_path = UPLOAD_PATH / file.filename
-    counter = 1
-    original_name = file.filename
-    while file_path.exists():
-        name_parts = original_name.rsplit('.', 1)
-        if len(name_parts) == 2:
-            new_name = f"{name_parts[0]}_{counter}.{name_parts[1]}"
-        else:
-            new_name = f"{original_name}_{counter}"
-        file_path = UPLOAD_PATH / new_name
-        counter += 1
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to start
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {MAX_FILE_SIZE / (1024*1024):.1f}MB"
-        )
+    file_path, fd = create_upload_file(file.filename)
     
     try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        # Stream file to disk in chunks, enforcing the size limit and hashing as we go
+        file_size = 0
+        file_hash = hashlib.blake2b(digest_size=16)
+        async with aiofiles.open(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > MAX_FILE_SIZE:
+                    break
+                file_hash.update(chunk)
+                await out.write(chunk)
+        
+        if file_size > MAX_FILE_SIZE:
+            file_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=413, detail=FILE_TOO_LARGE_MSG)
         
-        logger.info(f"File saved: {file_path}")
+        logger.info(f"File saved: {file_path} ({file_size} bytes)")
         
-        # Build and store index
+        # Identical file already indexed - skip re-indexing, as long as its points
+        # are still in the collection (it may have been dropped or recreated elsewhere)
+        digest = file_hash.hexdigest()
+        indexed = await asyncio.to_thread(get_indexed_file, QDRANT_COLLECTION, digest)
+        if indexed and not await has_source_points_async(qdrant, indexed[1]):
+            logger.info(f"Registered copy {indexed[1]} has no points in {QDRANT_COLLECTION}, re-indexing")
+            await asyncio.to_thread(forget_indexed_file, QDRANT_COLLECTION, digest)
+            indexed = None
+        if indexed:
+            indexed_filename, _, indexed_chunks = indexed
+            file_path.unlink(missing_ok=True)
+            logger.info(f"File identical to already indexed {indexed_filename}, skipping indexing")
+            return {
+                "status": "success",
+                "message": "File already indexed",
+                "filename": file.filename,
+                "chunks_indexed": indexed_chunks,
+                "file_type": file_ext
+            }
+        
+        # Build and store index (off the event loop - parsing, embedding and upserts block)
         # Try with force_recreate=False first, if dimension mismatch, retry with force_recreate=True
         try:
-            chunk_count = build_and_store_index(str(file_path), force_recreate=False)
+            chunk_count = await asyncio.to_thread(build_and_store_index, str(file_path), force_recreate=False)
         except (ValueError, Exception) as e:
             error_msg = str(e)
-            if "dimension" in error_msg.lower() or "dimensions" in error_msg.lower():
+            if _DIMENSION_RE.search(error_msg):
                 # Dimension mismatch - recreate collection
                 logger.warning(f"Dimension mismatch detected. Recreating collection...")
                 try:
-                    chunk_count = build_and_store_index(str(file_path), force_recreate=True)
+                    chunk_count = await asyncio.to_thread(build_and_store_index, str(file_path), force_recreate=True)
+                    # The collection was recreated, so earlier registrations point at nothing
+                    await asyncio.to_thread(clear_file_hashes, QDRANT_COLLECTION)
                 except Exception as retry_error:
                     logger.error(f"Failed to recreate collection and index: {retry_error}")
                     # Clean up file on error
@@ -153,31 +329,17 @@ async def upload_file(file: UploadFile = File(...)):
                 if file_path.exists():
                     file_path.unlink()
                 # Provide more helpful error messages
-                if "GOOGLE_API_KEY" in error_msg or "API key" in error_msg:
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Google API key is missing or invalid. Please check your .env file."
-                    )
-                elif "qdrant" in error_msg.lower() or "connection" in error_msg.lower():
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Cannot connect to Qdrant vector database. Please ensure Qdrant is running."
-                    )
-                elif "pypdf" in error_msg.lower():
-                    import sys
-                    detailed_msg = f"pypdf package not found in backend Python environment.\n"
-                    detailed_msg += f"Backend Python: {sys.executable}\n"
-                    detailed_msg += f"Please install: pip install pypdf\n"
-                    detailed_msg += f"Or restart backend with correct virtual environment."
-                    raise HTTPException(
-                        status_code=500,
-                        detail=detailed_msg
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Error processing file: {error_msg}"
-                    )
+                raise HTTPException(
+                    status_code=500,
+                    detail=triage_error(error_msg, UPLOAD_ERROR_MESSAGES) or f"Error processing file: {error_msg}"
+                )
+        
+        await asyncio.to_thread(
+            record_indexed_file, QDRANT_COLLECTION, digest, file.filename, file_path.name, chunk_count
+        )
+        
+        # Index changed, cached answers may be stale
+        answer_cache.clear()
         
         return {
             "status": "success",
@@ -198,14 +360,13 @@ async def upload_file(file: UploadFile = File(...)):
             except:
                 pass
         error_msg = str(e)
-        if "GOOGLE_API_KEY" in error_msg or "API key" in error_msg:
-            error_msg = "Google API key is missing or invalid. Please check your .env file."
-        elif "qdrant" in error_msg.lower() or "connection" in error_msg.lower():
-            error_msg = "Cannot connect to Qdrant vector database. Please ensure Qdrant is running."
+        error_msg = triage_error(error_msg, UPLOAD_ERROR_MESSAGES) or error_msg
         raise HTTPException(status_code=500, detail=f"Error processing file: {error_msg}")
 
 
 class AskRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
     question: str
     k: Optional[int] = None
     stream: bool = False
@@ -221,7 +382,8 @@ async def summarize_document(
     final_question = question or (request.question if request else None) or "Tóm tắt nội dung chính của tài liệu này một cách chi tiết và đầy đủ."
     
     try:
-        result = rag_query(final_question, k=10, stream=False)  # Use more chunks for summary
+        # Fetch a wide candidate set, rerank keeps only the relevant chunks
+        result = await asyncio.to_thread(cached_rag_query, final_question, k=20, rerank=True)
         return {
             "summary": result["answer"],
             "source_count": result["source_count"],
@@ -239,20 +401,8 @@ async def summarize_document(
     except Exception as e:
         logger.error(f"Error generating summary: {e}", exc_info=True)
         error_msg = str(e)
-        if "GOOGLE_API_KEY" in error_msg or "API key" in error_msg or "authentication" in error_msg.lower():
-            error_msg = "Google API key is missing or invalid. Please check your .env file."
-        elif "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
-            error_msg = "Google API quota exceeded or rate limited. Please try again later or check your API quota."
-        elif "collection" in error_msg.lower() or "qdrant" in error_msg.lower() or "connection" in error_msg.lower():
-            error_msg = "Vector database error. Please ensure Qdrant is running and you have uploaded at least one document."
-        elif "No documents" in error_msg or "empty" in error_msg.lower() or "No documents indexed" in error_msg:
-            error_msg = "No documents found. Please upload at least one document first."
-        elif "Failed to retrieve" in error_msg or "retrieve documents" in error_msg.lower():
-            error_msg = "Failed to retrieve documents from vector database. Please ensure documents are properly indexed."
-        elif "Failed to generate answer" in error_msg:
-            # Keep the detailed error message from rag_query
-            pass
-        raise HTTPException(status_code=500, detail=error_msg)
+        # Unmatched errors (e.g. "Failed to generate answer") keep the detailed message from rag_query
+        raise HTTPException(status_code=500, detail=triage_error(error_msg, QUERY_ERROR_MESSAGES) or error_msg)
 
 
 @app.post("/ask")
@@ -280,91 +430,99 @@ async def ask_question(
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     
     try:
-        result = rag_query(final_question, k=final_k, stream=final_stream)
+        if final_stream:
+            result = await asyncio.to_thread(rag_query, final_question, k=final_k, stream=True)
+        else:
+            result = await asyncio.to_thread(cached_rag_query, final_question, k=final_k)
         
         if final_stream:
             # Return streaming response
+            # Newline-delimited JSON: a header frame with the sources (serialized
+            # before the LLM call starts), then one {"delta": ...} frame per answer chunk
+            header = orjson.dumps({
+                "source_count": result["source_count"],
+                "sources": serialize_sources(result["sources"])
+            }) + b"\n"
+            
             def generate():
-                import json
-                yield '{"answer": "'
+                yield header
                 answer_stream = result.get("answer_stream")
                 if answer_stream:
                     try:
                         for chunk in answer_stream:
-                            # Escape JSON special characters
-                            chunk_escaped = chunk.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-                            yield chunk_escaped
+                            yield orjson.dumps({"delta": chunk}) + b"\n"
                     except Exception as e:
                         logger.error(f"Error in streaming: {e}")
-                        yield "Error in streaming response"
-                yield f'", "source_count": {result["source_count"]}, "sources": ['
-                
-                # Add sources info
-                sources_info = []
-                for i, doc in enumerate(result["sources"]):
-                    source_info = {
-                        "index": i + 1,
-                        "source_file": doc.metadata.get("source_file", "Unknown"),
-                        "page": doc.metadata.get("page"),
-                        "slide_number": doc.metadata.get("slide_number"),
-                        "content_type": doc.metadata.get("content_type"),
-                        "preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                    }
-                    sources_info.append(source_info)
-                
-                yield json.dumps(sources_info)
-                yield ']}'
+                        yield orjson.dumps({"error": "Error in streaming response"}) + b"\n"
             
             return StreamingResponse(
                 generate(),
-                media_type="application/json",
+                media_type="application/x-ndjson",
                 headers={"X-Accel-Buffering": "no"}  # Disable buffering for streaming
             )
         else:
             # Return non-streaming response
-            sources_info = []
-            for i, doc in enumerate(result["sources"]):
-                sources_info.append({
-                    "index": i + 1,
-                    "source_file": doc.metadata.get("source_file", "Unknown"),
-                    "page": doc.metadata.get("page"),
-                    "slide_number": doc.metadata.get("slide_number"),
-                    "content_type": doc.metadata.get("content_type"),
-                    "preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                })
-            
             return {
                 "answer": result["answer"],
                 "source_count": result["source_count"],
-                "sources": sources_info
+                "sources": serialize_sources(result["sources"])
             }
     except Exception as e:
         logger.error(f"Error processing question: {e}", exc_info=True)
         error_msg = str(e)
-        # Provide more helpful error messages
-        if "GOOGLE_API_KEY" in error_msg or "API key" in error_msg or "authentication" in error_msg.lower():
-            error_msg = "Google API key is missing or invalid. Please check your .env file."
-        elif "collection" in error_msg.lower() or "qdrant" in error_msg.lower() or "connection" in error_msg.lower():
-            error_msg = "Vector database error. Please ensure Qdrant is running and you have uploaded at least one document."
-        elif "No documents" in error_msg or "empty" in error_msg.lower() or "No documents indexed" in error_msg:
-            error_msg = "No documents found. Please upload at least one document first."
-        elif "Failed to retrieve" in error_msg or "retrieve documents" in error_msg.lower():
-            error_msg = "Failed to retrieve documents from vector database. Please ensure documents are properly indexed."
-        elif "Failed to generate answer" in error_msg:
-            # Keep the detailed error message from rag_query
-            pass
-        raise HTTPException(status_code=500, detail=error_msg)
+        # Provide more helpful error messages; unmatched errors keep the detail from rag_query
+        raise HTTPException(status_code=500, detail=triage_error(error_msg, QUERY_ERROR_MESSAGES) or error_msg)
+
+
+@app.post("/ask/batch")
+async def ask_questions_batch(requests: List[AskRequest]):
+    """
+    Ask several questions at once.
+    Retrieval for all questions is done in a single vector database request.
+    Streaming is not supported for batches.
+    """
+    questions = [request.question for request in requests]
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many questions in one batch (max {ASK_BATCH_MAX_QUESTIONS})"
+        )
+    if any(not question or not question.strip() for question in questions):
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    try:
+        results = await asyncio.to_thread(rag_query_batch, questions, [request.k for request in requests])
+        return [
+            {
+                "question": question,
+                "answer": result["answer"],
+                "error": result.get("error") and (
+                    triage_error(result["error"], QUERY_ERROR_MESSAGES) or result["error"]
+                ),
+                "source_count": result["source_count"],
+                "sources": serialize_sources(result["sources"])
+            }
+            for question, result in zip(questions, results)
+        ]
+    except Exception as e:
+        logger.error(f"Error processing batch questions: {e}", exc_info=True)
+        error_msg = str(e)
+        raise HTTPException(status_code=500, detail=triage_error(error_msg, QUERY_ERROR_MESSAGES) or error_msg)
 
 
 @app.delete("/reset")
-async def reset_index():
+async def reset_index(qdrant: AsyncQdrantClient = Depends(get_async_qdrant)):
     """
     Reset the vector database by deleting the collection.
     This will remove all indexed documents.
     """
     try:
-        success = delete_collection()
+        success = await delete_collection_async(qdrant)
         if success:
+            answer_cache.clear()
+            await asyncio.to_thread(clear_file_hashes, QDRANT_COLLECTION)
             # Also clear uploads directory
             for file_path in UPLOAD_PATH.iterdir():
                 if file_path.is_file():
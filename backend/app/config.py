@@ -22,11 +22,32 @@ if not GOOGLE_API_KEY or GOOGLE_API_KEY == "your_google_api_key_here":
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "multimodal_rag")
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "768"))  # text-embedding-004 uses 768 dimensions
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))  # seconds per request
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "true").lower() == "true"  # int8 scalar quantization for new collections
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))  # candidates re-scored with full vectors
+QDRANT_SEGMENT_NUMBER = int(os.getenv("QDRANT_SEGMENT_NUMBER", "0"))  # 0 = one per CPU core (min 2)
+QDRANT_OPTIMIZATION_THREADS = int(os.getenv("QDRANT_OPTIMIZATION_THREADS", "0"))  # 0 = server default
 
 # Model Configuration
 EMBEDDING_MODEL = "text-embedding-004"  # Google embedding model
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
 VISION_MODEL = os.getenv("VISION_MODEL", "gemini-2.0-flash")
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "8"))  # Concurrent vision (OCR/caption) requests
+
+# Embedding Batching Configuration
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # Texts per embedding request
+EMBED_PARALLEL = int(os.getenv("EMBED_PARALLEL", "8"))  # Concurrent embedding requests
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))  # Retries on rate limiting (429)
+
+# Ingestion Configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))  # Points per upsert request
+INGEST_PARALLEL = int(os.getenv("INGEST_PARALLEL", "1"))  # Upload worker processes
+
+# Image Processing Configuration
+VISION_MIN_IMAGE_AREA = int(os.getenv("VISION_MIN_IMAGE_AREA", "4096"))  # px; smaller images skip OCR/caption
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1568"))  # px; longer sides are downscaled before vision
 
 # Text Splitting Configuration
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
@@ -34,8 +55,27 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 
 # Retrieval Configuration
 DEFAULT_K = int(os.getenv("DEFAULT_K", "5"))
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "20"))  # Questions per /ask/batch request
+ASK_BATCH_PARALLEL = int(os.getenv("ASK_BATCH_PARALLEL", "8"))  # Concurrent answer generations per batch
+
+# Reranking Configuration (MMR over retrieved candidates)
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.55"))  # cosine similarity to query
+RERANK_MIN_K = int(os.getenv("RERANK_MIN_K", "3"))
+RERANK_MAX_K = int(os.getenv("RERANK_MAX_K", "10"))
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+
+# Answer Cache Configuration (semantic cache for /ask and /summarize)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))  # cosine similarity
 
 # Upload Configuration
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50")) * 1024 * 1024  # 50MB default
 
+# Embedding Cache Configuration
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "embed_cache")
+
+# Uploaded file hashes (skip re-indexing identical uploads)
+FILE_HASH_DB = os.getenv("FILE_HASH_DB", "file_hashes.sqlite3")
+
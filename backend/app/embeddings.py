@@ -1,10 +1,39 @@
 """
 Embeddings module using Google text-embedding-004 model.
 """
+import asyncio
+import functools
+import hashlib
+import itertools
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import List
+import numpy as np
 from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from app.config import EMBEDDING_MODEL, GOOGLE_API_KEY
+from app.config import (
+    EMBEDDING_MODEL, EMBEDDING_DIM, GOOGLE_API_KEY, EMBED_CACHE_DIR,
+    EMBED_BATCH_SIZE, EMBED_PARALLEL, EMBED_MAX_RETRIES
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Batching Configuration
+BATCH_SIZE = EMBED_BATCH_SIZE
+MAX_PARALLEL = EMBED_PARALLEL
+
+# Error substrings that indicate rate limiting (worth retrying)
+_RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "rate limit", "quota")
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return any(marker in error_msg for marker in _RATE_LIMIT_MARKERS)
 
 
 class GoogleEmbeddings(Embeddings):
@@ -21,11 +50,172 @@ class GoogleEmbeddings(Embeddings):
             google_api_key=GOOGLE_API_KEY
         )
     
+    def _embed_batch(self, batch: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+        """Embed one batch, retrying with exponential backoff when rate limited."""
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return self.embeddings_client.embed_documents(batch, task_type=task_type)
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES or not _is_rate_limited(e):
+                    raise
+                delay = 2 ** attempt + random.random()
+                logger.warning(f"Embedding rate limited, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents."""
-        return self.embeddings_client.embed_documents(texts)
+        """
+        Embed a list of documents.
+        Texts are split into batches that are embedded concurrently;
+        results are returned in input order.
+        """
+        batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+        if len(batches) <= 1:
+            return self._embed_batch(texts) if texts else []
+
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(batches))) as executor:
+            results = executor.map(self._embed_batch, batches)
+            return list(itertools.chain.from_iterable(results))
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of embed_documents for use from async endpoints."""
+        batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(MAX_PARALLEL)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings_client.aembed_documents(batch)
+
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return list(itertools.chain.from_iterable(results))
+    
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents as a (n, dim) float32 array."""
+        return np.asarray(self.embed_documents(texts), dtype=np.float32)
     
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query string."""
-        return self.embeddings_client.embed_query(text)
+        return self.embeddings_client.embed_query(text, task_type="retrieval_query")
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several query strings in one batched request."""
+        if not texts:
+            return []
+        return self._embed_batch(texts, task_type="retrieval_query")
+
+
+def _resolve_cache_path() -> Path:
+    """Resolve the embedding cache database path (relative to backend folder)."""
+    cache_dir = Path(EMBED_CACHE_DIR)
+    if not cache_dir.is_absolute():
+        backend_dir = Path(__file__).parent.parent
+        cache_dir = backend_dir / EMBED_CACHE_DIR
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    return cache_dir / "embeddings.sqlite3"
+
+
+class CachedGoogleEmbeddings(Embeddings):
+    """
+    GoogleEmbeddings with a persistent on-disk cache.
+    Vectors are keyed by SHA-256 of (model, text) and stored as float32 bytes,
+    so identical chunks are only embedded once across uploads.
+    """
 
+    def __init__(self, inner: Embeddings = None):
+        self.inner = inner or GoogleEmbeddings()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(_resolve_cache_path()), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(text: str, kind: str = "document") -> bytes:
+        # Queries are embedded with a different task type, so keep them apart
+        prefix = EMBEDDING_MODEL if kind == "document" else f"{EMBEDDING_MODEL}\0{kind}"
+        return hashlib.sha256(f"{prefix}\0{text}".encode("utf-8")).digest()
+
+    def _get_many(self, keys: List[bytes]) -> dict:
+        """Fetch cached vectors for the given keys."""
+        found = {}
+        unique_keys = list(set(keys))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _set_many(self, items: dict) -> None:
+        """Store vectors (already serialized as float32 bytes)."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items.items()
+            )
+            self._conn.commit()
+
+    def _embed_cached(self, texts: List[str], kind: str, embed_fn) -> np.ndarray:
+        """Return a (n, dim) float32 array, calling embed_fn only for cache misses."""
+        keys = [self._key(text, kind) for text in texts]
+        try:
+            cached = self._get_many(keys)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            cached = {}
+
+        # Embed each distinct missing text once
+        miss_indices = []
+        seen = set()
+        for i, key in enumerate(keys):
+            if key not in cached and key not in seen:
+                seen.add(key)
+                miss_indices.append(i)
+
+        if miss_indices:
+            new_vectors = embed_fn([texts[i] for i in miss_indices])
+            new_items = {
+                keys[i]: np.asarray(vector, dtype=np.float32).tobytes()
+                for i, vector in zip(miss_indices, new_vectors)
+            }
+            cached.update(new_items)
+            try:
+                self._set_many(new_items)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+        logger.info(f"Embedding cache: {len(texts)} {kind} texts, {len(miss_indices)} embedded")
+        if not keys:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        vectors = np.empty((len(keys), len(cached[keys[0]]) // 4), dtype=np.float32)
+        for i, key in enumerate(keys):
+            vectors[i] = np.frombuffer(cached[key], dtype=np.float32)
+        return vectors
+
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents as a (n, dim) float32 array."""
+        return self._embed_cached(texts, "document", self.inner.embed_documents)
+
+    def embed_queries_np(self, texts: List[str]) -> np.ndarray:
+        """Embed several query strings as a (n, dim) float32 array."""
+        return self._embed_cached(texts, "query", self.inner.embed_queries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents, only calling the API for cache misses."""
+        return self.embed_documents_np(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query string (served from cache when possible)."""
+        return self.embed_queries_np([text])[0].tolist()
+
+
+@functools.lru_cache(maxsize=1)
+def get_embeddings() -> CachedGoogleEmbeddings:
+    """
+    Get the shared embeddings instance.
+    Reuses one client (and its connections) across requests.
+    """
+    return CachedGoogleEmbeddings()
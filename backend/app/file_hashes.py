@@ -0,0 +1,92 @@
+"""
+Registry of indexed file hashes.
+Lets the upload endpoint skip re-indexing bit-identical files.
+Entries are kept per Qdrant collection; callers should still confirm the
+recorded source has points in the collection before trusting a hit.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+from app.config import FILE_HASH_DB
+import logging
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Open (once) the SQLite database, relative to backend folder."""
+    global _conn
+    if _conn is None:
+        db_path = Path(FILE_HASH_DB)
+        if not db_path.is_absolute():
+            backend_dir = Path(__file__).parent.parent
+            db_path = backend_dir / FILE_HASH_DB
+        _conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_files ("
+            "collection TEXT NOT NULL, digest TEXT NOT NULL, filename TEXT NOT NULL, "
+            "source_file TEXT NOT NULL, chunks INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, digest))"
+        )
+        _conn.commit()
+    return _conn
+
+
+def get_indexed_file(collection: str, digest: str) -> Optional[Tuple[str, str, int]]:
+    """Return (filename, source_file, chunks) for a file hash indexed into collection, or None."""
+    try:
+        with _lock:
+            return _get_connection().execute(
+                "SELECT filename, source_file, chunks FROM indexed_files "
+                "WHERE collection = ? AND digest = ?",
+                (collection, digest)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"File hash lookup failed: {e}")
+        return None
+
+
+def record_indexed_file(collection: str, digest: str, filename: str, source_file: str, chunks: int) -> None:
+    """Remember that a file with this hash has been indexed into collection."""
+    try:
+        with _lock:
+            conn = _get_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_files "
+                "(collection, digest, filename, source_file, chunks) VALUES (?, ?, ?, ?, ?)",
+                (collection, digest, filename, source_file, chunks)
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record file hash: {e}")
+
+
+def forget_indexed_file(collection: str, digest: str) -> None:
+    """Drop a single entry (e.g. when its points are no longer in the collection)."""
+    try:
+        with _lock:
+            conn = _get_connection()
+            conn.execute(
+                "DELETE FROM indexed_files WHERE collection = ? AND digest = ?", (collection, digest)
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not forget file hash: {e}")
+
+
+def clear_file_hashes(collection: Optional[str] = None) -> None:
+    """Forget indexed file hashes of one collection, or all (e.g. after the index is reset)."""
+    try:
+        with _lock:
+            conn = _get_connection()
+            if collection is None:
+                conn.execute("DELETE FROM indexed_files")
+            else:
+                conn.execute("DELETE FROM indexed_files WHERE collection = ?", (collection,))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not clear file hashes: {e}")
@@ -0,0 +1,26 @@
+"""
+Shared Google GenAI client for the LLM and vision calls.
+The SDK is imported on first use, so importing the modules that call Gemini stays cheap.
+"""
+import functools
+from app.config import GOOGLE_API_KEY
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def get_genai_client():
+    """
+    Get the shared Google GenAI client, created on first use.
+    One client (and its HTTP connection pool) serves all LLM and vision requests.
+    Returns None if the client cannot be initialized.
+    """
+    if not GOOGLE_API_KEY:
+        return None
+    try:
+        from google import genai
+        return genai.Client(api_key=GOOGLE_API_KEY)
+    except Exception as e:
+        logger.error(f"Failed to initialize Google GenAI client: {e}")
+        return None
@@ -7,6 +7,7 @@ import logging
 from pathlib import Path
 from typing import List, Tuple, Optional
 from langchain_core.documents import Document
+from app.config import VISION_MAX_SIDE
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +16,8 @@ PDF_AVAILABLE = False
 PDF_ERROR = None
 try:
     import fitz  # pymupdf
-    import pypdf  # Required by PyPDFLoader
-    from langchain_community.document_loaders import PyPDFLoader
     PDF_AVAILABLE = True
-    logger.info(f"PDF support enabled. pypdf version: {getattr(pypdf, '__version__', 'unknown')}")
+    logger.info(f"PDF support enabled. PyMuPDF version: {getattr(fitz, 'VersionBind', 'unknown')}")
 except ImportError as e:
     PDF_ERROR = str(e)
     logger.warning(f"PDF support disabled: {e}")
@@ -43,66 +42,51 @@ import base64
 import io
 
 
-def load_pdf(path: str) -> List[Document]:
-    """Load PDF file and extract text with page metadata."""
+def _require_pdf_support() -> None:
+    """Raise a helpful ImportError if PyMuPDF is not installed."""
     if not PDF_AVAILABLE:
-        error_msg = "PDF support requires both PyMuPDF (fitz) and pypdf. "
-        error_msg += "Install with: pip install pymupdf pypdf"
+        error_msg = "PDF support requires PyMuPDF (fitz). "
+        error_msg += "Install with: pip install pymupdf"
         if PDF_ERROR:
             error_msg += f"\nOriginal error: {PDF_ERROR}"
         raise ImportError(error_msg)
+
+
+def load_pdf(path: str, doc=None) -> List[Document]:
+    """
+    Load PDF file and extract text with page metadata.
+    Accepts an already opened fitz document to avoid re-parsing the file.
+    Empty pages are skipped.
+    """
+    _require_pdf_support()
     
-    # Double check pypdf is available at runtime
-    try:
-        import pypdf
-        import sys
-        pypdf_path = pypdf.__file__ if hasattr(pypdf, '__file__') else 'unknown'
-        logger.info(f"Using pypdf from: {pypdf_path}, Python: {sys.executable}")
-    except ImportError as import_err:
-        import sys
-        error_msg = f"`pypdf` package not found in current Python environment.\n"
-        error_msg += f"Python executable: {sys.executable}\n"
-        error_msg += f"Please install with: pip install pypdf\n"
-        error_msg += f"Or activate the correct virtual environment."
-        raise ImportError(error_msg)
-    
+    owns_doc = doc is None
     try:
-        # Verify PyPDFLoader can be imported and used
-        try:
-            from langchain_community.document_loaders import PyPDFLoader
-        except ImportError as loader_err:
-            import sys
-            error_msg = f"PyPDFLoader cannot be imported: {loader_err}\n"
-            error_msg += f"Python executable: {sys.executable}\n"
-            error_msg += f"This may indicate langchain-community is not properly installed.\n"
-            error_msg += f"Try: pip install --upgrade langchain-community"
-            raise ImportError(error_msg)
-        
-        logger.info(f"Loading PDF with PyPDFLoader: {path}")
-        loader = PyPDFLoader(path)
+        if owns_doc:
+            doc = fitz.open(path)
+        source_file = os.path.basename(path)
         documents = []
-        for i, doc in enumerate(loader.load()):
-            # Add page number to metadata
-            doc.metadata["page"] = i + 1
-            doc.metadata["file_type"] = "pdf"
-            doc.metadata["source_file"] = os.path.basename(path)
-            documents.append(doc)
+        for page_index in range(len(doc)):
+            text = doc[page_index].get_text("text")
+            if not text.strip():
+                continue
+            documents.append(Document(
+                page_content=text,
+                metadata={
+                    "page": page_index + 1,
+                    "file_type": "pdf",
+                    "source_file": source_file
+                }
+            ))
         logger.info(f"Successfully loaded {len(documents)} pages from PDF")
         return documents
-    except ImportError as e:
-        error_msg = str(e)
-        import sys
-        if "pypdf" in error_msg.lower() or "pypdf" in error_msg:
-            detailed_msg = f"`pypdf` package not found at runtime.\n"
-            detailed_msg += f"Python executable: {sys.executable}\n"
-            detailed_msg += f"Please install with: pip install pypdf\n"
-            detailed_msg += f"Or restart backend with correct virtual environment."
-            raise ImportError(detailed_msg)
-        raise ImportError(f"Error loading PDF: {error_msg}")
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error processing PDF file {path}: {error_msg}", exc_info=True)
         raise ValueError(f"Error processing PDF file: {error_msg}")
+    finally:
+        if owns_doc and doc is not None:
+            doc.close()
 
 
 def load_docx(path: str) -> List[Document]:
@@ -202,26 +186,99 @@ def load_image(path: str) -> Tuple[bytes, dict]:
     return image_bytes, metadata
 
 
-def extract_images_from_pdf(path: str) -> List[Tuple[bytes, dict]]:
-    """Extract images from PDF with page metadata."""
+def get_image_area(image_bytes: bytes) -> Optional[int]:
+    """Return width * height from the image header, or None if it can't be parsed."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            width, height = img.size
+    except Exception:
+        return None
+    return width * height
+
+
+# Recompression Configuration for extracted images
+RECOMPRESS_MIN_BYTES = 512_000  # Only lossless images larger than this are recompressed
+RECOMPRESS_FORMATS = frozenset({"png", "bmp"})
+RECOMPRESS_JPEG_QUALITY = 85
+
+
+def flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """
+    Convert an image to RGB for JPEG encoding.
+    Transparent pixels are composited onto white rather than turning black,
+    which would hide dark text drawn on a transparent background.
+    """
+    if "A" in img.getbands() or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def maybe_recompress(image_bytes: bytes, fmt: str) -> Tuple[bytes, str]:
+    """
+    Re-encode large lossless images (PNG/BMP) as JPEG to cut bytes sent to the Vision API.
+    Oversized images are downscaled to VISION_MAX_SIDE in the same pass, so vision
+    does not decode and re-encode them (lossily) a second time.
+    Returns (image_bytes, format); the input is returned unchanged if not worth it.
+    """
+    fmt = (fmt or "").lower()
+    if fmt not in RECOMPRESS_FORMATS or len(image_bytes) <= RECOMPRESS_MIN_BYTES:
+        return image_bytes, fmt
+    
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+            buf = io.BytesIO()
+            flatten_to_rgb(img).save(buf, "JPEG", quality=RECOMPRESS_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not recompress {fmt} image: {e}")
+        return image_bytes, fmt
+    
+    recompressed = buf.getvalue()
+    if len(recompressed) >= len(image_bytes):
+        return image_bytes, fmt
+    return recompressed, "jpeg"
+
+
+def extract_images_from_pdf(path: str, doc=None) -> List[Tuple[bytes, dict]]:
+    """
+    Extract images from PDF with page metadata.
+    Accepts an already opened fitz document to avoid re-parsing the file.
+    """
     if not PDF_AVAILABLE:
         return []
     
-    doc = fitz.open(path)
+    owns_doc = doc is None
+    if owns_doc:
+        doc = fitz.open(path)
+    source_file = os.path.basename(path)
+    jobs = [
+        (page_index, img_index, img[0])
+        for page_index in range(len(doc))
+        for img_index, img in enumerate(doc.get_page_images(page_index))
+    ]
+    
+    # Decode each embedded image (xref) once, even if it appears on many pages.
+    # PyMuPDF documents are not thread-safe, so extraction stays on this thread.
+    extracted = {}
     images = []
-    for page_index in range(len(doc)):
-        page = doc[page_index]
-        for img_index, img in enumerate(doc.get_page_images(page_index)):
-            xref = img[0]
+    for page_index, img_index, xref in jobs:
+        if xref not in extracted:
             base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            metadata = {
-                "page": page_index + 1,
-                "image_index": img_index,
-                "source_file": os.path.basename(path)
-            }
-            images.append((image_bytes, metadata))
-    doc.close()
+            extracted[xref] = maybe_recompress(base_image["image"], base_image.get("ext"))
+        image_bytes, image_format = extracted[xref]
+        metadata = {
+            "page": page_index + 1,
+            "image_index": img_index,
+            "source_file": source_file,
+            "image_format": image_format
+        }
+        images.append((image_bytes, metadata))
+    logger.info(f"Extracted {len(images)} images ({len(extracted)} unique) from PDF file")
+    if owns_doc:
+        doc.close()
     return images
 
 
@@ -239,12 +296,12 @@ def extract_images_from_pptx(path: str) -> List[Tuple[bytes, dict]]:
                 # Check if shape has an image
                 if hasattr(shape, "image"):
                     try:
-                        image_bytes = shape.image.blob
+                        image_bytes, image_format = maybe_recompress(shape.image.blob, shape.image.ext)
                         metadata = {
                             "slide_number": slide_num,
                             "image_index": shape_index,
                             "source_file": os.path.basename(path),
-                            "image_format": shape.image.ext  # e.g., 'png', 'jpeg'
+                            "image_format": image_format  # e.g., 'png', 'jpeg'
                         }
                         images.append((image_bytes, metadata))
                         logger.info(f"Extracted image from slide {slide_num}, shape {shape_index}")
@@ -271,8 +328,14 @@ def load_document(file_path: str) -> Tuple[List[Document], List[Tuple[bytes, dic
     images = []
     
     if ext == ".pdf":
-        text_docs = load_pdf(file_path)
-        images = extract_images_from_pdf(file_path)
+        _require_pdf_support()
+        # Parse the PDF once and share the handle for text and images
+        doc = fitz.open(file_path)
+        try:
+            text_docs = load_pdf(file_path, doc=doc)
+            images = extract_images_from_pdf(file_path, doc=doc)
+        finally:
+            doc.close()
     elif ext == ".docx":
         text_docs = load_docx(file_path)
     elif ext == ".pptx":
@@ -2,33 +2,58 @@
 RAG (Retrieval-Augmented Generation) pipeline module.
 Handles document indexing, retrieval, and answer generation.
 """
-from typing import List, Dict, Optional, Iterator
+import functools
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Iterator, Tuple
+import numpy as np
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.embeddings import Embeddings
-from app.loader import load_document
-from app.vision import caption_image_bytes, ocr_image_bytes
-from app.embeddings import GoogleEmbeddings
-from app.store import create_collection_if_not_exists, create_vectorstore_from_docs, get_vectorstore, get_qdrant_client
+from langchain_community.vectorstores import Qdrant
+from app.loader import load_document, get_image_area
+from app.vision import process_images
+from app.embeddings import get_embeddings
+from app.genai_client import get_genai_client
+from app.store import (
+    create_vectorstore_from_docs, get_vectorstore,
+    get_qdrant_client, batch_similarity_search
+)
 from app.config import (
-    QDRANT_COLLECTION, CHUNK_SIZE, CHUNK_OVERLAP, 
-    DEFAULT_K, LLM_MODEL, GOOGLE_API_KEY
+    QDRANT_COLLECTION, CHUNK_SIZE, CHUNK_OVERLAP, VISION_MIN_IMAGE_AREA,
+    DEFAULT_K, ASK_BATCH_PARALLEL, LLM_MODEL, GOOGLE_API_KEY,
+    RERANK_MIN_SCORE, RERANK_MIN_K, RERANK_MAX_K, RERANK_MMR_LAMBDA
 )
-from google import genai
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize Google GenAI client for LLM
+# Language detection tables, built once at import
+LANG_DETECT_PREFIX = 2000
+_VI_CHARS = 'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ'
+_VI_CHARS_DELETE = str.maketrans('', '', _VI_CHARS)
+_VI_WORDS = ('là', 'của', 'và', 'với', 'cho', 'được', 'trong', 'về', 'này', 'đó',
+             'như', 'theo', 'từ', 'đến', 'có', 'không', 'một', 'các', 'đã', 'sẽ')
+# One alternation scanned in a single pass; case-insensitive so the text needn't be lowered.
+# Stays on stdlib re: RE2's \b is ASCII-only and would miss words ending in a diacritic.
+_VI_WORDS_RE = re.compile(r'\b(?:' + '|'.join(map(re.escape, _VI_WORDS)) + r')\b', re.IGNORECASE)
+
+# Chunk settings are fixed per process, so build the splitter once
+TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len
+)
+
 if not GOOGLE_API_KEY:
     logger.warning("GOOGLE_API_KEY is not set. Some features may not work.")
-    client = None
-else:
-    try:
-        client = genai.Client(api_key=GOOGLE_API_KEY)
-    except Exception as e:
-        logger.error(f"Failed to initialize Google GenAI client: {e}")
-        client = None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_vectorstore() -> Qdrant:
+    """Get the shared vectorstore for the default collection (built once per process)."""
+    return get_vectorstore(get_embeddings())
 
 
 def build_and_store_index(file_path: str, force_recreate: bool = False) -> int:
@@ -49,47 +74,51 @@ def build_and_store_index(file_path: str, force_recreate: bool = False) -> int:
     logger.info(f"Loaded {len(text_docs)} text documents and {len(images)} images")
     
     # 2. Split text documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len
-    )
-    
-    split_text_docs = []
-    for doc in text_docs:
-        split_docs = text_splitter.split_documents([doc])
-        split_text_docs.extend(split_docs)
+    split_text_docs = TEXT_SPLITTER.split_documents(text_docs)
     
     logger.info(f"Split into {len(split_text_docs)} text chunks")
     
-    # 3. Process images: OCR + Caption
+    # 3. Process images: OCR + Caption (remote calls, run concurrently)
+    # Tiny images (spacers, icons) are skipped; repeated images (logos) are sent once
+    image_keys = []
+    for img_bytes, metadata in images:
+        area = get_image_area(img_bytes)
+        if area is not None and area < VISION_MIN_IMAGE_AREA:
+            image_keys.append(None)
+        else:
+            image_keys.append(hashlib.blake2b(img_bytes, digest_size=16).digest())
+    unique_images = {}
+    for key, (img_bytes, metadata) in zip(image_keys, images):
+        if key is not None and key not in unique_images:
+            unique_images[key] = img_bytes
+    if images:
+        logger.info(f"Sending {len(unique_images)} of {len(images)} images to vision "
+                    f"({image_keys.count(None)} too small, rest duplicates)")
+    
     image_docs = []
-    for i, (img_bytes, metadata) in enumerate(images):
-        logger.info(f"Processing image {i+1}/{len(images)}")
+    if unique_images:
+        # OCR + caption for every distinct image, all in flight on the shared vision pool
+        results = dict(zip(unique_images, process_images(list(unique_images.values()))))
         
-        try:
-            # OCR
-            ocr_text = ocr_image_bytes(img_bytes)
+        # Assemble in image order: OCR then caption for each image
+        for key, (img_bytes, metadata) in zip(image_keys, images):
+            if key is None:
+                continue
+            ocr_text, caption = results[key]
             if ocr_text:
-                ocr_doc = Document(
+                ocr_metadata = metadata.copy()
+                ocr_metadata["content_type"] = "ocr"
+                image_docs.append(Document(
                     page_content=f"[IMAGE OCR] {ocr_text}",
-                    metadata={**metadata, "content_type": "ocr"}
-                )
-                image_docs.append(ocr_doc)
-        except Exception as e:
-            logger.warning(f"Error processing OCR for image {i+1}: {e}")
-        
-        try:
-            # Caption
-            caption = caption_image_bytes(img_bytes, detailed=True)
+                    metadata=ocr_metadata
+                ))
             if caption:
-                caption_doc = Document(
+                # The loader builds one metadata dict per image, so the caption doc can own it
+                metadata["content_type"] = "caption"
+                image_docs.append(Document(
                     page_content=f"[IMAGE DESCRIPTION] {caption}",
-                    metadata={**metadata, "content_type": "caption"}
-                )
-                image_docs.append(caption_doc)
-        except Exception as e:
-            logger.warning(f"Error processing caption for image {i+1}: {e}")
+                    metadata=metadata
+                ))
     
     logger.info(f"Created {len(image_docs)} image-based documents")
     
@@ -100,16 +129,9 @@ def build_and_store_index(file_path: str, force_recreate: bool = False) -> int:
     if not all_docs:
         raise ValueError("No documents to index. File may be empty or unreadable.")
     
-    # 5. Create collection if needed
+    # 5. Generate embeddings and store (the collection is created, if needed, after embedding)
     try:
-        create_collection_if_not_exists()
-    except Exception as e:
-        logger.error(f"Error creating collection: {e}")
-        raise ValueError(f"Cannot connect to Qdrant vector database: {str(e)}")
-    
-    # 6. Generate embeddings and store
-    try:
-        embeddings = GoogleEmbeddings()
+        embeddings = get_embeddings()
     except Exception as e:
         logger.error(f"Error initializing embeddings: {e}")
         raise ValueError(f"Failed to initialize embeddings: {str(e)}")
@@ -128,135 +150,90 @@ def build_and_store_index(file_path: str, force_recreate: bool = False) -> int:
     return len(all_docs)
 
 
+# Answer prompt pieces (static, so built once at import)
+_LANG_INSTR_VI = (
+    "Trả lời bằng tiếng Việt một cách chi tiết, đầy đủ và rõ ràng: ngôn ngữ tự nhiên, dễ hiểu; "
+    "giải thích đầy đủ các khái niệm; ví dụ cụ thể khi có thể; trình bày có cấu trúc với các đoạn văn rõ ràng."
+)
+
+_LANG_INSTR_EN = (
+    "Answer in the same language as the question, providing a detailed, comprehensive, "
+    "and well-structured response in natural, clear language."
+)
+
+# Invariant instructions go in the system instruction; only context + question vary per request
+_SYSTEM_INSTRUCTION_TEMPLATE = """You are an expert AI assistant for document analysis and question answering. Answer from the document context given with each question.
+
+Language: {language_instruction} Always match the question's language (Vietnamese -> Vietnamese, English -> English) throughout.
+
+Rules:
+1. Be thorough, never a brief summary: about 300-500 words for complex questions, 150-300 for simpler ones. Elaborate on every relevant point with explanation and background.
+2. Structure: short introduction; clear paragraphs of 2-4 sentences; bullet (•) or numbered lists for multiple items; **bold** key terms; brief conclusion when appropriate.
+3. Use ALL relevant context: synthesize information across sources, explain how the pieces relate, include specific examples, data or quotes.
+4. Cite sources ("According to Source 1...", "The text states...") and mention when sources agree.
+5. Fully answer every aspect and sub-question of the question.
+6. For questions about images, use the image descriptions and OCR text and describe visual elements in detail.
+7. Write clearly and professionally, using the context's terminology and defining technical terms when needed."""
+
+_PROMPT_TEMPLATE = """Context from documents:
+{context}
+
+User's question: {question}"""
+
+# LLM generation settings per answer language
+# No max_output_tokens limit - let the model generate as much as needed for comprehensive answers
+GENERATION_CONFIGS = {
+    lang: {
+        "temperature": 0.7,
+        "system_instruction": _SYSTEM_INSTRUCTION_TEMPLATE.format(language_instruction=instruction)
+    }
+    for lang, instruction in (("vi", _LANG_INSTR_VI), ("en", _LANG_INSTR_EN))
+}
+
+
+@functools.lru_cache(maxsize=2048)
 def _detect_language(text: str) -> str:
     """Detect language from text. Returns 'vi' for Vietnamese, 'en' for English, or 'auto'."""
-    # Vietnamese character set
-    vietnamese_chars = 'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ'
+    # A question's language is decidable from a short prefix
+    text = text[:LANG_DETECT_PREFIX]
     
-    # Count Vietnamese characters
-    vi_count = sum(1 for char in text if char in vietnamese_chars)
-    total_chars = len([c for c in text if c.isalpha()])
+    # Count Vietnamese characters (str.translate runs in C)
+    vi_count = len(text) - len(text.translate(_VI_CHARS_DELETE))
     
     # If more than 5% Vietnamese characters or Vietnamese words detected, consider it Vietnamese
-    if total_chars > 0 and (vi_count / total_chars > 0.05 or vi_count > 3):
+    if vi_count > 3:
         return 'vi'
+    if vi_count > 0:
+        # Vietnamese characters are letters, so total_chars > 0 here
+        total_chars = sum(map(str.isalpha, text))
+        if vi_count / total_chars > 0.05:
+            return 'vi'
     
     # Check for common Vietnamese words
-    vietnamese_words = ['là', 'của', 'và', 'với', 'cho', 'được', 'trong', 'về', 'này', 'đó', 
-                        'như', 'theo', 'từ', 'đến', 'có', 'không', 'một', 'các', 'đã', 'sẽ']
-    text_lower = text.lower()
-    vi_word_count = sum(1 for word in vietnamese_words if word in text_lower)
+    vi_word_count = len({word.lower() for word in _VI_WORDS_RE.findall(text)})
     if vi_word_count >= 2:
         return 'vi'
     
     return 'en'
 
 
+def _build_prompt(context: str, question: str) -> Tuple[str, dict]:
+    """Build the answer prompt and the generation config matching the question's language."""
+    config = GENERATION_CONFIGS['vi' if _detect_language(question) == 'vi' else 'en']
+    return _PROMPT_TEMPLATE.format(context=context, question=question), config
+
+
 def _generate_answer_stream(context: str, question: str) -> Iterator[str]:
     """Generate streaming answer."""
+    client = get_genai_client()
     if not client:
         raise ValueError("Google API client is not initialized. Please check GOOGLE_API_KEY in .env file.")
     
-    # Detect language from question
-    detected_lang = _detect_language(question)
-    
-    if detected_lang == 'vi':
-        language_instruction = """Trả lời bằng tiếng Việt một cách chi tiết, đầy đủ và rõ ràng. 
-        - Sử dụng ngôn ngữ tự nhiên, dễ hiểu
-        - Giải thích đầy đủ các khái niệm
-        - Cung cấp ví dụ cụ thể khi có thể
-        - Trình bày có cấu trúc với các đoạn văn rõ ràng"""
-    else:
-        language_instruction = """Answer in the same language as the question, providing a detailed, comprehensive, and well-structured response.
-        - Use natural, clear language
-        - Explain concepts thoroughly
-        - Provide specific examples when possible
-        - Structure your response with clear paragraphs"""
-    
-    prompt = f"""You are an expert AI assistant specialized in document analysis and question answering. Your task is to provide detailed, comprehensive, and well-structured answers based on the provided context.
-
-Context from documents:
-{context}
-
-User's question: {question}
-
-CRITICAL INSTRUCTIONS - FOLLOW THESE CAREFULLY:
-
-1. LANGUAGE REQUIREMENT: {language_instruction}
-   - Match the language of the question exactly
-   - If question is in Vietnamese, answer in Vietnamese
-   - If question is in English, answer in English
-   - Maintain consistency throughout the response
-
-2. LENGTH AND COMPREHENSIVENESS (VERY IMPORTANT):
-   - Provide a THOROUGH, DETAILED answer - NOT a brief summary
-   - Aim for at least 300-500 words for complex questions, 150-300 words for simpler ones
-   - Elaborate on ALL relevant points mentioned in the context
-   - Include background information and context when relevant
-   - Do NOT give short, one-sentence answers
-   - Expand on each point with explanations and details
-
-3. STRUCTURE AND ORGANIZATION:
-   - Start with a brief introduction that summarizes what you'll cover
-   - Organize main points clearly with:
-     * Clear paragraphs for each major point
-     * Bullet points or numbered lists for multiple items
-     * Subheadings or bold text for key sections (if using markdown)
-   - Include specific examples, data, or quotes from the context
-   - End with a brief conclusion or summary if appropriate
-
-4. DETAIL AND DEPTH:
-   - Include ALL relevant information from the context
-   - If multiple sources mention the same topic, synthesize them comprehensively
-   - Explain relationships between different pieces of information
-   - Provide context and background when helpful
-   - Don't skip important details - be thorough
-
-5. FORMATTING AND READABILITY:
-   - Use clear paragraphs (2-4 sentences each)
-   - Use bullet points (•) or numbered lists (1., 2., 3.) for multiple items
-   - Use line breaks to separate major sections
-   - Bold or emphasize key terms when appropriate (using **bold** in markdown)
-   - Make the answer easy to scan and read
-
-6. CITATIONS AND SOURCES:
-   - Reference specific sources when mentioning information
-   - Use phrases like "According to Source 1...", "As mentioned in the document...", "The text states..."
-   - When multiple sources agree, mention that
-
-7. COMPLETENESS:
-   - Ensure your answer FULLY addresses the question
-   - If the question asks for multiple aspects, cover ALL of them
-   - If the question has sub-questions, answer each one
-   - Don't leave any part of the question unanswered
-
-8. IMAGES AND VISUAL CONTENT:
-   - If the question is about images, refer to the image descriptions and OCR text provided
-   - Describe visual elements in detail when relevant
-
-9. CLARITY AND PROFESSIONALISM:
-   - Write in a clear, professional manner
-   - Use appropriate terminology from the context
-   - Define technical terms if needed
-   - Ensure the answer is easy to understand
-
-10. QUALITY CHECK:
-    - Before finalizing, ensure the answer is:
-      * Long enough (not too brief)
-      * Comprehensive (covers all aspects)
-      * Well-structured (easy to read)
-      * In the correct language
-      * Based on the provided context
-
-REMEMBER: The user expects a THOROUGH, DETAILED response that fully answers their question. Do NOT provide a brief summary. Be comprehensive, clear, and well-organized.
-"""
+    prompt, config = _build_prompt(context, question)
     response = client.models.generate_content_stream(
         model=LLM_MODEL,
         contents=prompt,
-        config={
-            "temperature": 0.7,
-            # No max_output_tokens limit - let the model generate as much as needed for comprehensive answers
-        }
+        config=config
     )
     
     for chunk in response:
@@ -280,109 +257,15 @@ def generate_answer(context: str, question: str, stream: bool = False):
         return _generate_answer_stream(context, question)
     
     # Non-streaming response
+    client = get_genai_client()
     if not client:
         raise ValueError("Google API client is not initialized. Please check GOOGLE_API_KEY in .env file.")
     
-    # Detect language from question
-    detected_lang = _detect_language(question)
-    
-    if detected_lang == 'vi':
-        language_instruction = """Trả lời bằng tiếng Việt một cách chi tiết, đầy đủ và rõ ràng. 
-        - Sử dụng ngôn ngữ tự nhiên, dễ hiểu
-        - Giải thích đầy đủ các khái niệm
-        - Cung cấp ví dụ cụ thể khi có thể
-        - Trình bày có cấu trúc với các đoạn văn rõ ràng"""
-    else:
-        language_instruction = """Answer in the same language as the question, providing a detailed, comprehensive, and well-structured response.
-        - Use natural, clear language
-        - Explain concepts thoroughly
-        - Provide specific examples when possible
-        - Structure your response with clear paragraphs"""
-    
-    prompt = f"""You are an expert AI assistant specialized in document analysis and question answering. Your task is to provide detailed, comprehensive, and well-structured answers based on the provided context.
-
-Context from documents:
-{context}
-
-User's question: {question}
-
-CRITICAL INSTRUCTIONS - FOLLOW THESE CAREFULLY:
-
-1. LANGUAGE REQUIREMENT: {language_instruction}
-   - Match the language of the question exactly
-   - If question is in Vietnamese, answer in Vietnamese
-   - If question is in English, answer in English
-   - Maintain consistency throughout the response
-
-2. LENGTH AND COMPREHENSIVENESS (VERY IMPORTANT):
-   - Provide a THOROUGH, DETAILED answer - NOT a brief summary
-   - Aim for at least 300-500 words for complex questions, 150-300 words for simpler ones
-   - Elaborate on ALL relevant points mentioned in the context
-   - Include background information and context when relevant
-   - Do NOT give short, one-sentence answers
-   - Expand on each point with explanations and details
-
-3. STRUCTURE AND ORGANIZATION:
-   - Start with a brief introduction that summarizes what you'll cover
-   - Organize main points clearly with:
-     * Clear paragraphs for each major point
-     * Bullet points or numbered lists for multiple items
-     * Subheadings or bold text for key sections (if using markdown)
-   - Include specific examples, data, or quotes from the context
-   - End with a brief conclusion or summary if appropriate
-
-4. DETAIL AND DEPTH:
-   - Include ALL relevant information from the context
-   - If multiple sources mention the same topic, synthesize them comprehensively
-   - Explain relationships between different pieces of information
-   - Provide context and background when helpful
-   - Don't skip important details - be thorough
-
-5. FORMATTING AND READABILITY:
-   - Use clear paragraphs (2-4 sentences each)
-   - Use bullet points (•) or numbered lists (1., 2., 3.) for multiple items
-   - Use line breaks to separate major sections
-   - Bold or emphasize key terms when appropriate (using **bold** in markdown)
-   - Make the answer easy to scan and read
-
-6. CITATIONS AND SOURCES:
-   - Reference specific sources when mentioning information
-   - Use phrases like "According to Source 1...", "As mentioned in the document...", "The text states..."
-   - When multiple sources agree, mention that
-
-7. COMPLETENESS:
-   - Ensure your answer FULLY addresses the question
-   - If the question asks for multiple aspects, cover ALL of them
-   - If the question has sub-questions, answer each one
-   - Don't leave any part of the question unanswered
-
-8. IMAGES AND VISUAL CONTENT:
-   - If the question is about images, refer to the image descriptions and OCR text provided
-   - Describe visual elements in detail when relevant
-
-9. CLARITY AND PROFESSIONALISM:
-   - Write in a clear, professional manner
-   - Use appropriate terminology from the context
-   - Define technical terms if needed
-   - Ensure the answer is easy to understand
-
-10. QUALITY CHECK:
-    - Before finalizing, ensure the answer is:
-      * Long enough (not too brief)
-      * Comprehensive (covers all aspects)
-      * Well-structured (easy to read)
-      * In the correct language
-      * Based on the provided context
-
-REMEMBER: The user expects a THOROUGH, DETAILED response that fully answers their question. Do NOT provide a brief summary. Be comprehensive, clear, and well-organized.
-"""
+    prompt, config = _build_prompt(context, question)
     response = client.models.generate_content(
         model=LLM_MODEL,
         contents=prompt,
-        config={
-            "temperature": 0.7,
-            # No max_output_tokens limit - let the model generate as much as needed for comprehensive answers
-        }
+        config=config
     )
     # Handle different response formats from Google API
     try:
@@ -420,7 +303,106 @@ REMEMBER: The user expects a THOROUGH, DETAILED response that fully answers thei
         raise ValueError(f"Failed to parse response from Google API: {str(e)}")
 
 
-def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
+def _rerank_documents(question: str, docs: List[Document], embeddings: Embeddings) -> List[Document]:
+    """
+    Select a relevant, non-redundant subset of retrieved documents with MMR.
+    
+    Keeps documents whose similarity to the question is at least RERANK_MIN_SCORE
+    (but never fewer than RERANK_MIN_K, never more than RERANK_MAX_K), then
+    returns them in canonical document order so repeated prompts are identical.
+    """
+    if len(docs) <= RERANK_MIN_K:
+        return docs
+    
+    # Chunk embeddings are served from the embedding cache filled at ingest time
+    texts = [doc.page_content for doc in docs]
+    if hasattr(embeddings, "embed_documents_np"):
+        doc_vecs = embeddings.embed_documents_np(texts)  # float32 straight from the cache
+    else:
+        doc_vecs = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    query_vec = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+    doc_vecs /= np.maximum(np.linalg.norm(doc_vecs, axis=1, keepdims=True), 1e-12)
+    query_vec /= max(np.linalg.norm(query_vec), 1e-12)
+    
+    relevance = doc_vecs @ query_vec
+    similarity = doc_vecs @ doc_vecs.T
+    
+    selected = []
+    candidates = list(range(len(docs)))
+    while candidates and len(selected) < RERANK_MAX_K:
+        if selected:
+            redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates), dtype=np.float32)
+        mmr_scores = RERANK_MMR_LAMBDA * relevance[candidates] - (1 - RERANK_MMR_LAMBDA) * redundancy
+        best = candidates[int(np.argmax(mmr_scores))]
+        if relevance[best] < RERANK_MIN_SCORE and len(selected) >= RERANK_MIN_K:
+            break
+        selected.append(best)
+        candidates.remove(best)
+    
+    logger.info(f"Reranked {len(docs)} candidates down to {len(selected)} documents")
+    selected.sort(key=lambda i: (
+        str(docs[i].metadata.get("source_file", "")),
+        docs[i].metadata.get("page") or docs[i].metadata.get("slide_number") or 0,
+        i
+    ))
+    return [docs[i] for i in selected]
+
+
+# Retrieval methods across LangChain versions, most reliable first
+def _retrieve_similarity_search(vectorstore: Qdrant, question: str, k: int) -> List[Document]:
+    return vectorstore.similarity_search(question, k=k)
+
+
+def _retrieve_with_retriever(vectorstore: Qdrant, question: str, k: int) -> List[Document]:
+    retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    if hasattr(retriever, 'invoke'):
+        return retriever.invoke(question)
+    return retriever(question)
+
+
+def _retrieve_search(vectorstore: Qdrant, question: str, k: int) -> List[Document]:
+    return vectorstore.search(question, k=k)
+
+
+_RETRIEVAL_METHODS = (
+    ("similarity_search", _retrieve_similarity_search),
+    ("retriever", _retrieve_with_retriever),
+    ("search", _retrieve_search),
+)
+
+# Method that worked on the first query; reused directly afterwards
+_retrieve_fn: Optional[Callable[[Qdrant, str, int], List[Document]]] = None
+
+
+def _retrieve(vectorstore: Qdrant, question: str, k: int) -> List[Document]:
+    """
+    Retrieve documents for a question.
+    The first call probes the methods in _RETRIEVAL_METHODS and caches the
+    first one that works, so later queries make a single direct call.
+    """
+    global _retrieve_fn
+    if _retrieve_fn is not None:
+        return _retrieve_fn(vectorstore, question, k)
+    
+    last_error = None
+    for name, retrieve_fn in _RETRIEVAL_METHODS:
+        try:
+            docs = retrieve_fn(vectorstore, question, k)
+        except Exception as e:
+            last_error = e
+            logger.warning(f"{name} retrieval failed: {e}, trying next method")
+            continue
+        logger.debug(f"Retrieved {len(docs)} documents using {name}; caching method")
+        _retrieve_fn = retrieve_fn
+        return docs
+    
+    logger.error(f"All retrieval methods failed. Last error: {last_error}")
+    raise ValueError(f"Failed to retrieve documents: {str(last_error)}")
+
+
+def rag_query(question: str, k: int = None, stream: bool = False, rerank: bool = False) -> Dict:
     """
     Perform RAG query: retrieve relevant documents and generate answer.
     
@@ -428,6 +410,8 @@ def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
         question: User question
         k: Number of documents to retrieve (defaults to config)
         stream: If True, return streaming response
+        rerank: If True, treat the k retrieved documents as candidates and keep
+            only a relevant, diverse subset (see _rerank_documents)
     
     Returns:
         Dictionary with answer, sources, and metadata
@@ -436,52 +420,20 @@ def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
     
     try:
         # Get vectorstore
-        embeddings = GoogleEmbeddings()
-        vectorstore = get_vectorstore(embeddings)
+        embeddings = get_embeddings()
+        vectorstore = _get_vectorstore()
         
         # Retrieve relevant documents
-        # Handle different LangChain versions - try multiple methods
-        docs = None
-        last_error = None
-        
-        # Method 1: Try similarity_search directly (most reliable)
-        try:
-            docs = vectorstore.similarity_search(question, k=k)
-            logger.debug(f"Retrieved {len(docs)} documents using similarity_search")
-        except Exception as e1:
-            last_error = e1
-            logger.warning(f"similarity_search failed: {e1}, trying retriever methods")
-            
-            # Method 2: Try using retriever with invoke (LangChain v0.1+)
-            try:
-                retriever = vectorstore.as_retriever(search_kwargs={"k": k})
-                if hasattr(retriever, 'invoke'):
-                    docs = retriever.invoke(question)
-                    logger.debug(f"Retrieved {len(docs)} documents using retriever.invoke")
-                elif hasattr(retriever, '__call__'):
-                    # Try calling retriever directly
-                    docs = retriever(question)
-                    logger.debug(f"Retrieved {len(docs)} documents using retriever()")
-                else:
-                    raise AttributeError("Retriever has no invoke or __call__ method")
-            except Exception as e2:
-                last_error = e2
-                logger.warning(f"retriever methods failed: {e2}, trying search method")
-                
-                # Method 3: Try search method if available
-                try:
-                    if hasattr(vectorstore, 'search'):
-                        docs = vectorstore.search(question, k=k)
-                        logger.debug(f"Retrieved {len(docs)} documents using search")
-                    else:
-                        raise AttributeError("No search method available")
-                except Exception as e3:
-                    last_error = e3
-                    logger.error(f"All retrieval methods failed. Last error: {e3}")
-                    raise ValueError(f"Failed to retrieve documents: {str(e3)}")
+        docs = _retrieve(vectorstore, question, k)
         
         if not docs:
             raise ValueError("No documents retrieved. Please ensure documents are indexed.")
+        
+        if rerank:
+            try:
+                docs = _rerank_documents(question, docs, embeddings)
+            except Exception as rerank_error:
+                logger.warning(f"Reranking failed, using all retrieved documents: {rerank_error}")
             
     except ValueError as ve:
         # Re-raise ValueError as-is (these are our custom errors)
@@ -507,6 +459,28 @@ def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
         else:
             raise ValueError(f"Failed to retrieve documents: {error_msg}")
     
+    return _answer_from_docs(question, docs, stream=stream)
+
+
+@functools.lru_cache(maxsize=4096)
+def _source_label(source_file: str, page: Optional[int], slide_number: Optional[int]) -> str:
+    """Format the per-document part of a source header (cached: chunks recur across queries)."""
+    if page is not None:
+        return f"{source_file} (Page {page})"
+    if slide_number is not None:
+        return f"{source_file} (Slide {slide_number})"
+    return source_file
+
+
+def _format_source(i: int, doc: Document) -> str:
+    """Format one retrieved document as a labelled context block."""
+    metadata = doc.metadata
+    label = _source_label(metadata.get("source_file", "Unknown"), metadata.get("page"), metadata.get("slide_number"))
+    return f"[Source {i+1}: {label}]\n{doc.page_content}"
+
+
+def _answer_from_docs(question: str, docs: List[Document], stream: bool = False) -> Dict:
+    """Build context from retrieved documents and generate the answer."""
     if not docs:
         return {
             "answer": "I couldn't find any relevant information in the uploaded documents to answer your question.",
@@ -515,18 +489,7 @@ def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
         }
     
     # Build context from retrieved documents
-    context_parts = []
-    for i, doc in enumerate(docs):
-        source_info = doc.metadata.get("source_file", "Unknown")
-        page_info = ""
-        if "page" in doc.metadata:
-            page_info = f" (Page {doc.metadata['page']})"
-        elif "slide_number" in doc.metadata:
-            page_info = f" (Slide {doc.metadata['slide_number']})"
-        
-        context_parts.append(f"[Source {i+1}: {source_info}{page_info}]\n{doc.page_content}")
-    
-    context = "\n\n---\n\n".join(context_parts)
+    context = "\n\n---\n\n".join(_format_source(i, doc) for i, doc in enumerate(docs))
     
     # Generate answer
     if stream:
@@ -559,3 +522,50 @@ def rag_query(question: str, k: int = None, stream: bool = False) -> Dict:
                 error_msg = "Google AI client not initialized. Please check GOOGLE_API_KEY in .env file."
             raise ValueError(f"Failed to generate answer: {error_msg}")
 
+
+def _answer_batch_question(question: str, docs: List[Document]) -> Dict:
+    """
+    Answer one question of a batch.
+    Failures (including no retrieved documents, as in rag_query) are returned
+    under "error" instead of raised, so they don't fail the other questions.
+    """
+    try:
+        if not docs:
+            raise ValueError("No documents retrieved. Please ensure documents are indexed.")
+        return _answer_from_docs(question, docs)
+    except Exception as e:
+        logger.warning(f"Batch question failed: {e}")
+        return {"answer": None, "error": str(e), "sources": docs, "source_count": len(docs)}
+
+
+def rag_query_batch(questions: List[str], ks: Optional[List[Optional[int]]] = None) -> List[Dict]:
+    """
+    Perform several RAG queries at once.
+    Questions are embedded in one request and searched with a single Qdrant
+    batch query; answers are then generated concurrently.
+    
+    Args:
+        questions: User questions
+        ks: Number of documents to retrieve for each question (defaults to config)
+    
+    Returns:
+        List of result dictionaries (as rag_query), aligned with questions.
+        A question that failed has answer None and the reason under "error".
+    """
+    if not questions:
+        return []
+    ks = [k or DEFAULT_K for k in (ks or [None] * len(questions))]
+    
+    try:
+        embeddings = get_embeddings()
+        query_vectors = embeddings.embed_queries_np(questions)
+        docs_per_question = batch_similarity_search(query_vectors, ks)
+    except Exception as e:
+        logger.error(f"Error retrieving documents for batch: {e}", exc_info=True)
+        error_msg = str(e)
+        if "connection" in error_msg.lower() or "qdrant" in error_msg.lower():
+            raise ValueError("Cannot connect to Qdrant vector database. Please ensure Qdrant is running.")
+        raise ValueError(f"Failed to retrieve documents: {error_msg}")
+    
+    with ThreadPoolExecutor(max_workers=min(ASK_BATCH_PARALLEL, len(questions))) as executor:
+        return list(executor.map(_answer_batch_question, questions, docs_per_question))
@@ -2,12 +2,24 @@
 Vector store module for Qdrant integration.
 Handles collection creation and vector store operations.
 """
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
+import functools
+import os
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    VectorParams, Distance, QueryRequest, NamedVector, OptimizersConfigDiff, HnswConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams, QuantizationSearchParams,
+    PayloadSelectorInclude, Filter, FieldCondition, MatchValue
+)
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from typing import List
-from app.config import QDRANT_URL, QDRANT_COLLECTION, EMBEDDING_DIM
+from typing import List, Optional, Sequence, Set
+from app.config import (
+    QDRANT_URL, QDRANT_COLLECTION, EMBEDDING_DIM, QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_TIMEOUT,
+    QDRANT_QUANTIZATION, QDRANT_OVERSAMPLING, QDRANT_SEGMENT_NUMBER, QDRANT_OPTIMIZATION_THREADS,
+    INGEST_BATCH_SIZE, INGEST_PARALLEL
+)
 import logging
 
 # Use langchain-community Qdrant (more stable)
@@ -15,44 +27,122 @@ from langchain_community.vectorstores import Qdrant
 
 logger = logging.getLogger(__name__)
 
+# Qdrant's default optimizer indexing threshold (KB of vectors per segment) and HNSW degree
+DEFAULT_INDEXING_THRESHOLD = 20000
+DEFAULT_HNSW_M = 16
 
+# int8 scalar quantization: searches read 1 byte per dimension from RAM, then the
+# oversampled top candidates are re-scored with the original float32 vectors
+QUANTIZATION_CONFIG = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+) if QDRANT_QUANTIZATION else None
+SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING)
+) if QDRANT_QUANTIZATION else None
+
+# Payload fields read back from search hits (the LangChain Qdrant layout)
+PAYLOAD_SELECTOR = PayloadSelectorInclude(include=[Qdrant.CONTENT_KEY, Qdrant.METADATA_KEY])
+
+# Collections whose vector size has been checked against EMBEDDING_DIM in this process
+_dim_verified: Set[str] = set()
+
+# Segments are searched in parallel, so match the segment count to CPU cores
+# (assumes Qdrant runs on a host comparable to this one unless configured)
+SEGMENT_NUMBER = QDRANT_SEGMENT_NUMBER or max(2, os.cpu_count() or 1)
+
+
+@functools.lru_cache(maxsize=1)
 def get_qdrant_client() -> QdrantClient:
-    """Get Qdrant client instance."""
-    return QdrantClient(url=QDRANT_URL)
+    """
+    Get the shared Qdrant client instance (reuses its connection pool).
+    Uses gRPC (unless disabled) for cheaper Protobuf framing on uploads and searches.
+    """
+    return QdrantClient(
+        url=QDRANT_URL,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+        timeout=QDRANT_TIMEOUT
+    )
 
 
-def create_collection_if_not_exists() -> QdrantClient:
+def create_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Create an async Qdrant client for the app lifespan.
+    Uses gRPC with keepalive (unless disabled) so one channel serves all requests.
+    """
+    return AsyncQdrantClient(
+        url=QDRANT_URL,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        grpc_port=QDRANT_GRPC_PORT,
+        grpc_options={"grpc.keepalive_time_ms": 10000},
+        timeout=QDRANT_TIMEOUT
+    )
+
+
+def create_collection_if_not_exists(
+    client: QdrantClient = None,
+    collection_name: str = None,
+    defer_index: bool = False
+) -> QdrantClient:
     """
     Create Qdrant collection if it doesn't exist.
     Returns the client instance.
-    """
-    client = get_qdrant_client()
     
-    # Check if collection exists
-    collections = client.get_collections().collections
-    collection_names = [col.name for col in collections]
+    Args:
+        client: Optional Qdrant client (defaults to the shared one)
+        collection_name: Optional collection name (defaults to config)
+        defer_index: If True, create the collection with HNSW indexing disabled
+            (indexing_threshold=0, m=0) for a bulk upload; the caller re-enables it
+    """
+    client = client or get_qdrant_client()
+    collection = collection_name or QDRANT_COLLECTION
     
-    if QDRANT_COLLECTION not in collection_names:
+    if not client.collection_exists(collection):
         client.create_collection(
-            collection_name=QDRANT_COLLECTION,
+            collection_name=collection,
             vectors_config=VectorParams(
                 size=EMBEDDING_DIM,
                 distance=Distance.COSINE
-            )
+            ),
+            optimizers_config=OptimizersConfigDiff(
+                default_segment_number=SEGMENT_NUMBER,
+                max_optimization_threads=QDRANT_OPTIMIZATION_THREADS or None,
+                indexing_threshold=0 if defer_index else None
+            ),
+            hnsw_config=HnswConfigDiff(m=0) if defer_index else None,
+            quantization_config=QUANTIZATION_CONFIG
         )
-        print(f"Created collection: {QDRANT_COLLECTION}")
+        logger.info(f"Created collection: {collection}")
     else:
-        print(f"Collection {QDRANT_COLLECTION} already exists")
+        logger.info(f"Collection {collection} already exists")
     
     return client
 
 
-def delete_collection(collection_name: str = None) -> bool:
+def delete_collection(collection_name: str = None, client: QdrantClient = None) -> bool:
     """Delete the Qdrant collection."""
     collection = collection_name or QDRANT_COLLECTION
     try:
-        client = get_qdrant_client()
+        client = client or get_qdrant_client()
         client.delete_collection(collection_name=collection)
+        _dim_verified.discard(collection)
+        logger.info(f"Deleted collection: {collection}")
+        return True
+    except Exception as e:
+        error_msg = str(e).lower()
+        if "not found" in error_msg:
+            logger.info(f"Collection {collection} does not exist (already deleted)")
+            return True
+        logger.error(f"Error deleting collection {collection}: {e}")
+        return False
+
+
+async def delete_collection_async(client: AsyncQdrantClient, collection_name: str = None) -> bool:
+    """Delete the Qdrant collection using the shared async client."""
+    collection = collection_name or QDRANT_COLLECTION
+    try:
+        await client.delete_collection(collection_name=collection)
+        _dim_verified.discard(collection)
         logger.info(f"Deleted collection: {collection}")
         return True
     except Exception as e:
@@ -64,6 +154,32 @@ def delete_collection(collection_name: str = None) -> bool:
         return False
 
 
+async def has_source_points_async(
+    client: AsyncQdrantClient,
+    source_file: str,
+    collection_name: str = None
+) -> bool:
+    """Check whether the collection still holds any points from source_file."""
+    collection = collection_name or QDRANT_COLLECTION
+    try:
+        points, _ = await client.scroll(
+            collection_name=collection,
+            scroll_filter=Filter(must=[FieldCondition(
+                key=f"{Qdrant.METADATA_KEY}.source_file",
+                match=MatchValue(value=source_file)
+            )]),
+            limit=1,
+            with_payload=False,
+            with_vectors=False
+        )
+        return bool(points)
+    except Exception as e:
+        # Missing collection (or Qdrant unreachable): treat as not indexed
+        if "not found" not in str(e).lower():
+            logger.warning(f"Could not check points of {source_file} in {collection}: {e}")
+        return False
+
+
 def create_vectorstore_from_docs(
     docs: List[Document],
     embeddings: Embeddings,
@@ -84,48 +200,163 @@ def create_vectorstore_from_docs(
     """
     collection = collection_name or QDRANT_COLLECTION
     
-    # Check if collection exists and has dimension mismatch
+    # Check if collection exists and has dimension mismatch.
+    # EMBEDDING_DIM is fixed per process, so a collection that passed is not re-checked.
     client = get_qdrant_client()
-    collections = client.get_collections().collections
-    collection_names = [col.name for col in collections]
-    
-    if collection in collection_names:
-        # Check dimension
-        try:
-            collection_info = client.get_collection(collection)
-            existing_dim = collection_info.config.params.vectors.size
-            if existing_dim != EMBEDDING_DIM:
-                if force_recreate:
-                    logger.info(f"Dimension mismatch detected ({existing_dim} vs {EMBEDDING_DIM}). Recreating collection...")
-                    if delete_collection(collection):
-                        logger.info(f"Collection {collection} deleted successfully")
-                        # Recreate it
-                        create_collection_if_not_exists()
+    if force_recreate or collection not in _dim_verified:
+        if client.collection_exists(collection):
+            # Check dimension
+            try:
+                collection_info = client.get_collection(collection)
+                existing_dim = collection_info.config.params.vectors.size
+                if existing_dim != EMBEDDING_DIM:
+                    if force_recreate:
+                        logger.info(f"Dimension mismatch detected ({existing_dim} vs {EMBEDDING_DIM}). Recreating collection...")
+                        if delete_collection(collection, client=client):
+                            logger.info(f"Collection {collection} deleted successfully")
+                            # Recreate it
+                            create_collection_if_not_exists(client=client, collection_name=collection, defer_index=True)
+                        else:
+                            logger.warning(f"Failed to delete collection {collection}, trying to continue...")
                     else:
-                        logger.warning(f"Failed to delete collection {collection}, trying to continue...")
-                else:
-                    raise ValueError(
-                        f"Existing Qdrant collection is configured for vectors with {existing_dim} dimensions. "
-                        f"Selected embeddings are {EMBEDDING_DIM}-dimensional. "
-                        f"If you want to recreate the collection, set `force_recreate` parameter to `True`."
-                    )
-        except Exception as e:
-            # If we can't check, try to proceed (might be empty collection)
-            if "not found" not in str(e).lower():
-                logger.warning(f"Could not check collection dimension: {e}")
-    
-    # Ensure collection exists (will create if deleted or doesn't exist)
-    create_collection_if_not_exists()
-    
-    # Create vectorstore from documents
-    vectorstore = Qdrant.from_documents(
-        documents=docs,
-        embedding=embeddings,
+                        raise ValueError(
+                            f"Existing Qdrant collection is configured for vectors with {existing_dim} dimensions. "
+                            f"Selected embeddings are {EMBEDDING_DIM}-dimensional. "
+                            f"If you want to recreate the collection, set `force_recreate` parameter to `True`."
+                        )
+            except ValueError:
+                raise
+            except Exception as e:
+                # If we can't check, try to proceed (might be empty collection)
+                if "not found" not in str(e).lower():
+                    logger.warning(f"Could not check collection dimension: {e}")
+    
+    # Embed (batched) before touching the collection, so a failure leaves it as it was
+    texts = [doc.page_content for doc in docs]
+    if hasattr(embeddings, "embed_documents_np"):
+        vectors = embeddings.embed_documents_np(texts)
+    else:
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    
+    # Ensure collection exists (will create if deleted or doesn't exist).
+    # HNSW indexing is deferred until all points are in, so the graph is built once;
+    # a new collection also skips HNSW neighbour writes (m=0) until then.
+    create_collection_if_not_exists(client=client, collection_name=collection, defer_index=True)
+    try:
+        set_indexing_threshold(client, collection, 0)  # Existing collections
+        upload_documents(client, collection, docs, vectors)
+    finally:
+        # m is read back rather than remembered from the check above: the collection may
+        # have been dropped and recreated with m=0 since then (e.g. /reset in another worker)
+        set_indexing_threshold(
+            client, collection, DEFAULT_INDEXING_THRESHOLD,
+            hnsw_m=DEFAULT_HNSW_M if hnsw_graph_deferred(client, collection) else None
+        )
+    _dim_verified.add(collection)
+    
+    return get_vectorstore(embeddings, collection_name=collection)
+
+
+def hnsw_graph_deferred(client: QdrantClient, collection: str) -> bool:
+    """Whether the collection was created with its HNSW graph deferred (m=0)."""
+    try:
+        return client.get_collection(collection).config.hnsw_config.m == 0
+    except Exception as e:
+        logger.warning(f"Could not read HNSW config of {collection}: {e}")
+        return False
+
+
+def set_indexing_threshold(
+    client: QdrantClient,
+    collection: str,
+    threshold: int,
+    hnsw_m: Optional[int] = None
+) -> None:
+    """
+    Set the optimizer indexing threshold (0 disables HNSW indexing).
+    If hnsw_m is given, the HNSW graph degree is updated too (m=0 disables the graph).
+    """
+    try:
+        client.update_collection(
+            collection_name=collection,
+            optimizer_config=OptimizersConfigDiff(indexing_threshold=threshold),
+            hnsw_config=HnswConfigDiff(m=hnsw_m) if hnsw_m is not None else None
+        )
+    except Exception as e:
+        logger.warning(f"Could not set indexing_threshold={threshold} on {collection}: {e}")
+
+
+def upload_documents(
+    client: QdrantClient,
+    collection: str,
+    docs: List[Document],
+    vectors: np.ndarray
+) -> None:
+    """
+    Upload documents with precomputed vectors using batched, optionally parallel uploads.
+    Payloads use the same layout as the LangChain Qdrant vectorstore.
+    """
+    payloads = [
+        {Qdrant.CONTENT_KEY: doc.page_content, Qdrant.METADATA_KEY: doc.metadata}
+        for doc in docs
+    ]
+    ids = [uuid.uuid4().hex for _ in docs]
+    client.upload_collection(
         collection_name=collection,
-        url=QDRANT_URL
+        vectors=vectors,
+        payload=payloads,
+        ids=ids,
+        batch_size=INGEST_BATCH_SIZE,
+        parallel=INGEST_PARALLEL,
+        wait=True
     )
+    logger.info(f"Uploaded {len(docs)} points to {collection} in batches of {INGEST_BATCH_SIZE}")
+
+
+class _QdrantSearchResult:
+    """Search hit in the shape LangChain's Qdrant vectorstore expects from client.search."""
+    __slots__ = ('id', 'score', 'payload')
     
-    return vectorstore
+    def __init__(self, point):
+        self.id = point.id
+        self.score = getattr(point, 'score', 0.0)
+        self.payload = getattr(point, 'payload', {})
+
+
+def _search_patch(client: QdrantClient, collection_name, query_vector, limit=10, score_threshold=None, **kwargs):
+    """Patch search method to use query_points"""
+    # Use query_points with NamedVector (simpler approach)
+    # query_vector can be a list or dict
+    if isinstance(query_vector, dict):
+        vector_name = list(query_vector.keys())[0]
+        vector_value = query_vector[vector_name]
+    else:
+        vector_name = None  # Use default vector
+        vector_value = query_vector
+    
+    # Query using query_points
+    if vector_name:
+        query = NamedVector(name=vector_name, vector=vector_value)
+    else:
+        query = vector_value  # Direct vector for default
+    
+    search_params = kwargs.pop('search_params', None) or SEARCH_PARAMS
+    # Never ship vectors back unless asked; only fetch the payload fields RAG reads
+    with_payload = kwargs.pop('with_payload', True)
+    with_vectors = kwargs.pop('with_vectors', False)
+    results = client.query_points(
+        collection_name=collection_name,
+        query=query,
+        limit=limit,
+        score_threshold=score_threshold,
+        search_params=search_params,
+        with_payload=PAYLOAD_SELECTOR if with_payload is True else with_payload,
+        with_vectors=with_vectors,
+        **{k: v for k, v in kwargs.items() if k not in ['query_filter']}
+    )
+    
+    # Convert to format expected by langchain
+    return [_QdrantSearchResult(point) for point in results.points]
 
 
 def get_vectorstore(
@@ -147,45 +378,9 @@ def get_vectorstore(
     # Create a patched QdrantClient that has search method
     client = get_qdrant_client()
     
-    # Patch client.search to use query_points if search doesn't exist
+    # Patch client.search to use query_points if it doesn't exist
     if not hasattr(client, 'search'):
-        def search_patch(collection_name, query_vector, limit=10, score_threshold=None, **kwargs):
-            """Patch search method to use query_points"""
-            from qdrant_client.models import NamedVector
-            
-            # Use query_points with NamedVector (simpler approach)
-            # query_vector can be a list or dict
-            if isinstance(query_vector, dict):
-                vector_name = list(query_vector.keys())[0]
-                vector_value = query_vector[vector_name]
-            else:
-                vector_name = None  # Use default vector
-                vector_value = query_vector
-            
-            # Query using query_points
-            if vector_name:
-                query = NamedVector(name=vector_name, vector=vector_value)
-            else:
-                query = vector_value  # Direct vector for default
-            
-            results = client.query_points(
-                collection_name=collection_name,
-                query=query,
-                limit=limit,
-                score_threshold=score_threshold,
-                **{k: v for k, v in kwargs.items() if k not in ['query_filter', 'with_payload', 'with_vectors']}
-            )
-            
-            # Convert to format expected by langchain
-            class SearchResult:
-                def __init__(self, point):
-                    self.id = point.id
-                    self.score = point.score if hasattr(point, 'score') else 0.0
-                    self.payload = point.payload if hasattr(point, 'payload') else {}
-            
-            return [SearchResult(point) for point in results.points]
-        
-        client.search = search_patch
+        client.search = functools.partial(_search_patch, client)
     
     # Both old and new Qdrant use 'embeddings' parameter
     vectorstore = Qdrant(
@@ -196,3 +391,43 @@ def get_vectorstore(
     
     return vectorstore
 
+
+def _query_requests(query_vectors: Sequence[Sequence[float]], limits: Sequence[int]) -> List[QueryRequest]:
+    """Build one payload-only QueryRequest per query vector for query_batch_points."""
+    return [
+        QueryRequest(query=np.asarray(vector, dtype=np.float32).tolist(), limit=limit, with_payload=PAYLOAD_SELECTOR, params=SEARCH_PARAMS)
+        for vector, limit in zip(query_vectors, limits)
+    ]
+
+
+def batch_similarity_search(
+    query_vectors: Sequence[Sequence[float]],
+    ks: Sequence[int],
+    collection_name: str = None
+) -> List[List[Document]]:
+    """
+    Search for several query vectors in a single Qdrant request.
+    
+    Args:
+        query_vectors: Query embeddings
+        ks: Number of documents to return for each query
+        collection_name: Optional collection name (defaults to config)
+    
+    Returns:
+        One list of Documents per query vector, in input order
+    """
+    collection = collection_name or QDRANT_COLLECTION
+    client = get_qdrant_client()
+    responses = client.query_batch_points(collection_name=collection, requests=_query_requests(query_vectors, ks))
+    
+    # Payload layout matches the LangChain Qdrant vectorstore
+    return [
+        [
+            Document(
+                page_content=(point.payload or {}).get(Qdrant.CONTENT_KEY, ""),
+                metadata=(point.payload or {}).get(Qdrant.METADATA_KEY) or {}
+            )
+            for point in response.points
+        ]
+        for response in responses
+    ]
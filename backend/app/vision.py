@@ -2,163 +2,248 @@
 Vision module for processing images using Google Gemini Vision API.
 Provides OCR and image captioning capabilities.
 """
-import base64
+import hashlib
 import io
-from typing import Optional
-from google import genai
-from google.genai import types
-from app.config import GOOGLE_API_KEY, VISION_MODEL
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from PIL import Image
+from app.config import GOOGLE_API_KEY, VISION_MODEL, VISION_CONCURRENCY, VISION_MAX_SIDE
+from app.genai_client import get_genai_client
+from app.loader import flatten_to_rgb
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize Google GenAI client
 if not GOOGLE_API_KEY:
     logger.warning("GOOGLE_API_KEY is not set. Vision features may not work.")
-    client = None
-else:
+
+
+# Magic-number prefixes of the image formats Gemini accepts
+_MAGIC_MIME_TYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def get_image_mime_type(image_bytes: bytes) -> str:
+    """Detect MIME type from the image's leading magic bytes (no decoding)."""
+    for magic, mime_type in _MAGIC_MIME_TYPES:
+        if image_bytes.startswith(magic):
+            return mime_type
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+# In-process LRU cache of vision results, keyed by (task, image content hash)
+LRU_MAX = 1024
+_CACHE: "OrderedDict[Tuple[str, bytes], str]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_key(task: str, image_bytes: bytes) -> Tuple[str, bytes]:
+    return task, hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+
+def _cache_get(key: Tuple[str, bytes]) -> Optional[str]:
+    with _CACHE_LOCK:
+        result = _CACHE.get(key)
+        if result is not None:
+            _CACHE.move_to_end(key)
+        return result
+
+
+def _cache_put(key: Tuple[str, bytes], result: Optional[str]) -> Optional[str]:
+    """Store a successful result (None is never cached) and return it."""
+    if result:
+        with _CACHE_LOCK:
+            _CACHE[key] = result
+            _CACHE.move_to_end(key)
+            while len(_CACHE) > LRU_MAX:
+                _CACHE.popitem(last=False)
+    return result
+
+
+# Prompts and generation settings
+CAPTION_PROMPT_DETAILED = (
+    "Please describe this image in detail, including any text, charts, graphs, "
+    "diagrams, tables, or visual elements. Include axis labels, data points, "
+    "and any other relevant information that would be useful for understanding the content."
+)
+CAPTION_PROMPT_BRIEF = "Please provide a brief description of this image."
+CAPTION_CONFIG = {"temperature": 0.4, "max_output_tokens": 1024}
+
+OCR_PROMPT = (
+    "Extract all text from this image. Preserve formatting and structure. "
+    "If there are tables, present them in a structured format."
+)
+OCR_CONFIG = {"temperature": 0.1, "max_output_tokens": 2048}
+
+# Images are downscaled to Gemini's native tile size (VISION_MAX_SIDE) before upload
+VISION_JPEG_QUALITY = 85
+
+
+def _prepare_for_vision(
+    image_bytes: bytes,
+    max_side: int = VISION_MAX_SIDE,
+    jpeg_quality: int = VISION_JPEG_QUALITY
+) -> Tuple[bytes, str]:
+    """
+    Downscale images larger than max_side (longest side) and re-encode them as JPEG.
+    Gemini resizes large inputs anyway, so this only cuts upload size.
+    Images within the limit (including ones the loader already recompressed
+    and downscaled) are returned unchanged.
+    Returns (image_bytes, mime_type).
+    """
     try:
-        client = genai.Client(api_key=GOOGLE_API_KEY)
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            if max(img.size) <= max_side:
+                return image_bytes, get_image_mime_type(image_bytes)
+            img.draft("RGB", (max_side, max_side))  # JPEG: decode at reduced scale
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            buf = io.BytesIO()
+            flatten_to_rgb(img).save(buf, "JPEG", quality=jpeg_quality, optimize=True)
     except Exception as e:
-        logger.error(f"Failed to initialize Google GenAI client: {e}")
-        client = None
+        logger.warning(f"Could not downscale image for vision: {e}")
+        return image_bytes, get_image_mime_type(image_bytes)
+    return buf.getvalue(), "image/jpeg"
 
 
-def get_image_mime_type(image_bytes: bytes) -> str:
-    """Detect MIME type from image bytes."""
-    img = io.BytesIO(image_bytes)
-    from PIL import Image
-    pil_img = Image.open(img)
-    format_map = {
-        "PNG": "image/png",
-        "JPEG": "image/jpeg",
-        "GIF": "image/gif",
-        "BMP": "image/bmp",
-        "WEBP": "image/webp"
-    }
-    return format_map.get(pil_img.format, "image/png")
-
-
-def caption_image_bytes(image_bytes: bytes, detailed: bool = True) -> Optional[str]:
+def _image_contents(prepared: Tuple[bytes, str], prompt: str) -> list:
+    """Build the request contents: the prepared image as an inline Blob, then the prompt."""
+    from google.genai import types
+    
+    image_bytes, mime_type = prepared
+    
+    # Use Part with inlineData (Blob) for image; the SDK encodes raw bytes for the wire
+    image_part = types.Part(
+        inline_data=types.Blob(
+            mime_type=mime_type,
+            data=image_bytes
+        )
+    )
+    text_part = types.Part(text=prompt)
+    return [image_part, text_part]
+
+
+def _response_text(response, kind: str) -> Optional[str]:
+    """Extract the text from a Gemini response (handles the different response formats)."""
+    try:
+        if hasattr(response, 'text') and response.text:
+            return response.text.strip()
+        elif hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                text_parts = [part.text for part in candidate.content.parts if hasattr(part, 'text')]
+                if text_parts:
+                    return ' '.join(text_parts).strip()
+        elif isinstance(response, str):
+            return response.strip()
+    except Exception as e:
+        logger.warning(f"Error parsing {kind} response: {e}")
+    return None
+
+
+def caption_image_bytes(
+    image_bytes: bytes,
+    detailed: bool = True,
+    prepared: Optional[Tuple[bytes, str]] = None
+) -> Optional[str]:
     """
     Use Google Gemini Vision to produce a detailed textual description of the image.
     
     Args:
-        image_bytes: Raw image bytes
+        image_bytes: Raw image bytes (also the cache key)
         detailed: If True, requests detailed description including charts, text, etc.
+        prepared: Optional _prepare_for_vision(image_bytes) result, to reuse across calls
     
     Returns:
         Caption string or None if error
     """
+    client = get_genai_client()
     if not client:
         logger.error("Google API client is not initialized. Cannot caption image.")
         return None
     
+    key = _cache_key("caption" if detailed else "caption-brief", image_bytes)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
-        mime_type = get_image_mime_type(image_bytes)
-        
-        prompt = (
-            "Please describe this image in detail, including any text, charts, graphs, "
-            "diagrams, tables, or visual elements. Include axis labels, data points, "
-            "and any other relevant information that would be useful for understanding the content."
-            if detailed
-            else "Please provide a brief description of this image."
-        )
-        
-        # Use Part with inlineData (Blob) for image
-        image_part = types.Part(
-            inline_data=types.Blob(
-                mime_type=mime_type,
-                data=b64
-            )
-        )
-        text_part = types.Part(text=prompt)
-        
+        prompt = CAPTION_PROMPT_DETAILED if detailed else CAPTION_PROMPT_BRIEF
         response = client.models.generate_content(
             model=VISION_MODEL,
-            contents=[image_part, text_part],
-            config={
-                "temperature": 0.4,
-                "max_output_tokens": 1024
-            }
+            contents=_image_contents(prepared or _prepare_for_vision(image_bytes), prompt),
+            config=CAPTION_CONFIG
         )
-        
-        # Handle different response formats from Google API
-        try:
-            if hasattr(response, 'text') and response.text:
-                return response.text.strip()
-            elif hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    text_parts = [part.text for part in candidate.content.parts if hasattr(part, 'text')]
-                    if text_parts:
-                        return ' '.join(text_parts).strip()
-            elif isinstance(response, str):
-                return response.strip()
-        except Exception as e:
-            print(f"Error parsing vision response: {e}")
-        return None
+        return _cache_put(key, _response_text(response, "vision"))
     except Exception as e:
-        print(f"Error captioning image: {e}")
+        logger.warning(f"Error captioning image: {e}")
         return None
 
 
-def ocr_image_bytes(image_bytes: bytes) -> Optional[str]:
+def ocr_image_bytes(image_bytes: bytes, prepared: Optional[Tuple[bytes, str]] = None) -> Optional[str]:
     """
     Extract text from image using Gemini Vision (OCR capability).
     
     Args:
-        image_bytes: Raw image bytes
+        image_bytes: Raw image bytes (also the cache key)
+        prepared: Optional _prepare_for_vision(image_bytes) result, to reuse across calls
     
     Returns:
         Extracted text or None if error
     """
+    client = get_genai_client()
     if not client:
         logger.error("Google API client is not initialized. Cannot perform OCR.")
         return None
     
+    key = _cache_key("ocr", image_bytes)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
-        mime_type = get_image_mime_type(image_bytes)
-        
-        # Use Part with inlineData (Blob) for image
-        image_part = types.Part(
-            inline_data=types.Blob(
-                mime_type=mime_type,
-                data=b64
-            )
-        )
-        text_part = types.Part(
-            text="Extract all text from this image. Preserve formatting and structure. "
-                 "If there are tables, present them in a structured format."
-        )
-        
-        response = client.models.generate_content(
+        # Stream the (long) OCR output so chunks are received and decoded as they arrive
+        stream = client.models.generate_content_stream(
             model=VISION_MODEL,
-            contents=[image_part, text_part],
-            config={
-                "temperature": 0.1,
-                "max_output_tokens": 2048
-            }
+            contents=_image_contents(prepared or _prepare_for_vision(image_bytes), OCR_PROMPT),
+            config=OCR_CONFIG
         )
-        
-        # Handle different response formats from Google API
-        try:
-            if hasattr(response, 'text') and response.text:
-                return response.text.strip()
-            elif hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    text_parts = [part.text for part in candidate.content.parts if hasattr(part, 'text')]
-                    if text_parts:
-                        return ' '.join(text_parts).strip()
-            elif isinstance(response, str):
-                return response.strip()
-        except Exception as e:
-            print(f"Error parsing OCR response: {e}")
-        return None
+        text_parts = [chunk.text for chunk in stream if chunk.text]
+        return _cache_put(key, "".join(text_parts).strip() or None)
     except Exception as e:
-        print(f"Error performing OCR: {e}")
+        logger.warning(f"Error performing OCR: {e}")
         return None
 
+
+# Shared pool for process_images; vision calls are network-bound
+_VISION_POOL = ThreadPoolExecutor(max_workers=VISION_CONCURRENCY, thread_name_prefix="vision")
+
+
+def process_images(images: List[bytes]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    OCR and caption (detailed) several images with all requests in flight together.
+    Returns one (ocr_text, caption) pair per image. The single-image functions
+    return None instead of raising, so one bad image can't sink the batch.
+    Each image is downscaled/re-encoded once and the result shared by both calls.
+    """
+    prepared = list(_VISION_POOL.map(_prepare_for_vision, images))
+    ocr_futures = [
+        _VISION_POOL.submit(ocr_image_bytes, image, prepared=ready)
+        for image, ready in zip(images, prepared)
+    ]
+    caption_futures = [
+        _VISION_POOL.submit(caption_image_bytes, image, detailed=True, prepared=ready)
+        for image, ready in zip(images, prepared)
+    ]
+    return [
+        (ocr_future.result(), caption_future.result())
+        for ocr_future, caption_future in zip(ocr_futures, caption_futures)
+    ]
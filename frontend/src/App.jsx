@@ -327,27 +327,39 @@ function AppContent() {
           const lines = buffer.split('\n')
           buffer = lines.pop() || ''
 
+          // Each line is a JSON frame: the leading {"sources"} header, then {"delta"} or {"error"}
           for (const line of lines) {
             if (line.trim()) {
               try {
-                const jsonStr = line.trim()
-                if (jsonStr.startsWith('{"answer": "')) {
-                  const match = jsonStr.match(/"answer":\s*"([^"]*)"/)
-                  if (match) {
-                    fullAnswer = match[1].replace(/\\n/g, '\n').replace(/\\"/g, '"')
-                    setMessages(prev => prev.map(msg => 
-                      msg.id === assistantId 
-                        ? { ...msg, content: fullAnswer, isLoading: false }
-                        : msg
-                    ))
-                  }
+                const frame = JSON.parse(line)
+                if (frame.delta) {
+                  fullAnswer += frame.delta
+                  setMessages(prev => prev.map(msg => 
+                    msg.id === assistantId 
+                      ? { ...msg, content: fullAnswer, isLoading: false }
+                      : msg
+                  ))
+                } else if (frame.error) {
+                  throw new Error(frame.error)
+                } else if (frame.sources) {
+                  setMessages(prev => prev.map(msg => 
+                    msg.id === assistantId 
+                      ? { ...msg, sources: frame.sources }
+                      : msg
+                  ))
                 }
               } catch (e) {
-                // Continue parsing
+                if (e instanceof SyntaxError) continue // Incomplete frame, keep parsing
+                throw e
               }
             }
           }
         }
+        setMessages(prev => prev.map(msg => 
+          msg.id === assistantId 
+            ? { ...msg, isLoading: false }
+            : msg
+        ))
       } else {
         // Handle non-streaming response
         const data = await response.json()